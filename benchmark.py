@@ -0,0 +1,623 @@
+"""
+Benchmark harness for the pairing engine
+
+Builds reproducible, seeded corpora of dish descriptions from the FOOD_KEYWORDS vocabulary and times each
+stage of the pipeline separately. Results can be written as JSON and compared against an earlier run:
+
+    python benchmark.py --size 2000 --output bench.json
+    python benchmark.py --size 2000 --compare bench.json --threshold 0.10
+"""
+import argparse
+import csv
+import heapq
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+import main
+
+CORPUS_KINDS = ("short", "long", "misspelled", "unknown")
+
+# Words that pad out menu copy without naming a food category
+MENU_FILLER = ["with", "and", "served", "over", "on", "a", "bed", "of", "house", "made", "fresh", "local",
+               "seasonal", "finished", "topped", "drizzled", "tossed", "in", "our", "signature", "light",
+               "rich", "hand", "cut", "slow", "tender", "golden", "side", "market", "garnished", "the"]
+SYLLABLES = ["ka", "zu", "mor", "vel", "qui", "tro", "bex", "lan", "dri", "wop", "yst", "gla", "fen", "xo"]
+
+
+def keyword_vocabulary():
+    """Return every keyword of the active knowledge base, in table order"""
+    return [keyword for keywords in main.get_knowledge_base().food_keywords.values() for keyword in keywords]
+
+
+def misspell(word, rng):
+    """Apply one random typo (drop, swap, double or replace a letter) to a word"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    typo = rng.choice(("drop", "swap", "double", "replace"))
+    if typo == "drop":
+        return word[:i] + word[i + 1:]
+    if typo == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if typo == "double":
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + rng.choice("aeiourstln") + word[i + 1:]
+
+
+def unknown_food(rng):
+    """Return a made-up dish name that no pairing rule matches, so it hits the DEFAULT_WINES fallback"""
+    rule_index = main.get_pairing_rule_index()
+    while True:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) for _ in range(rng.randint(1, 3))]
+        food_text = " ".join(words)
+        if not rule_index.matches(main.analyze_food_input(food_text)):
+            return food_text
+
+
+def build_corpus(kind, size, seed=0):
+    """Return a reproducible list of size dish descriptions of the given kind"""
+    rng = random.Random(f"{kind}:{seed}")
+    vocabulary = keyword_vocabulary()
+    dishes = []
+    for _ in range(size):
+        if kind == "short":
+            dishes.append(" ".join(rng.sample(vocabulary, rng.randint(1, 3))))
+        elif kind == "long":
+            words = [rng.choice(vocabulary) if rng.random() < 0.25 else rng.choice(MENU_FILLER)
+                     for _ in range(rng.randint(40, 80))]
+            dishes.append(" ".join(words).capitalize() + ".")
+        elif kind == "misspelled":
+            words = [misspell(keyword, rng) for keyword in rng.sample(vocabulary, rng.randint(1, 3))]
+            dishes.append(" ".join(words))
+        elif kind == "unknown":
+            dishes.append(unknown_food(rng))
+        else:
+            raise ValueError(f"Unknown corpus kind: {kind}")
+    return dishes
+
+
+def percentile(sorted_values, pct):
+    """Return the pct-th percentile of an already sorted list (nearest-rank)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies):
+    """Turn per-item latencies in seconds into throughput and latency percentiles"""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "total_s": round(total, 6),
+        "throughput_per_s": round(len(ordered) / total, 1) if total else 0.0,
+        "mean_ms": round(total / len(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 4),
+    }
+
+
+def time_pipeline(dishes):
+    """Time analyze_food_input, determine_wine_pairings and output rendering separately for each dish"""
+    timer = time.perf_counter
+    analyze, pairings, render, total = [], [], [], []
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        for food_text in dishes:
+            start = timer()
+            food_categories = main.analyze_food_input(food_text)
+            analyzed = timer()
+            wine_pairings = main.determine_wine_pairings(food_categories, food_text)
+            paired = timer()
+            main.print_wine_recommendations(food_text, wine_pairings)
+            rendered = timer()
+            sink.seek(0)
+            sink.truncate()
+
+            analyze.append(analyzed - start)
+            pairings.append(paired - analyzed)
+            render.append(rendered - paired)
+            total.append(rendered - start)
+    return {"analyze": summarize(analyze), "pairings": summarize(pairings),
+            "render": summarize(render), "total": summarize(total)}
+
+
+def peak_memory_kb(run):
+    """Return the peak traced allocation, in KiB, while calling run()"""
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def reset_memos():
+    """Clear per-word memos so every corpus starts from the same state"""
+    main.get_partial_match_index().category_hits.cache_clear()
+    main.get_fuzzy_match_index().correct.cache_clear()
+
+
+def run_pipeline_suite(size, seed):
+    """Per-stage timings and peak memory of the single-dish pipeline for each corpus kind"""
+    main.warm_up()
+    results = {}
+    for kind in CORPUS_KINDS:
+        dishes = build_corpus(kind, size, seed)
+        reset_memos()
+        timings = time_pipeline(dishes)
+        # Memory is traced in a separate pass; tracemalloc would distort the timings above
+        reset_memos()
+        timings["peak_memory_kb"] = peak_memory_kb(lambda: time_pipeline(dishes))
+        results[kind] = timings
+    return results
+
+
+def time_analyzer(analyzer, dishes, batched):
+    """Per-dish analysis cost of one analyzer backend, one dish at a time or as a single batch"""
+    timer = time.perf_counter
+    previous = main.get_analyzer()
+    main.use_analyzer(analyzer)
+    try:
+        if batched:
+            start = timer()
+            main.analyze_many(dishes)
+            elapsed = timer() - start
+            # Batches have no per-dish latency; report the amortized cost of each dish
+            return summarize([elapsed / len(dishes)] * len(dishes))
+        latencies = []
+        for food_text in dishes:
+            start = timer()
+            main.analyze_food_input(food_text)
+            latencies.append(timer() - start)
+        return summarize(latencies)
+    finally:
+        main.use_analyzer(previous)
+
+
+def run_analyzer_suite(size, seed):
+    """Per-dish analysis cost of the regex and spaCy analyzers, dish by dish and batched through nlp.pipe"""
+    main.warm_up()
+    analyzers = {"regex": main.RegexAnalyzer()}
+    results = {}
+    spacy_analyzer = main.SpacyAnalyzer()
+    try:
+        start = time.perf_counter()
+        spacy_analyzer.pipeline()
+        results["spacy_load"] = {"available": True, "load_ms": round((time.perf_counter() - start) * 1000, 1)}
+        analyzers["spacy"] = spacy_analyzer
+    except (ImportError, OSError) as e:
+        results["spacy_load"] = {"available": False, "error": str(e)}
+
+    for kind in ("short", "long"):
+        dishes = build_corpus(kind, size, seed)
+        timings = {}
+        for name, analyzer in analyzers.items():
+            reset_memos()
+            timings[name] = time_analyzer(analyzer, dishes, batched=False)
+            reset_memos()
+            timings[f"{name}_batch"] = time_analyzer(analyzer, dishes, batched=True)
+        results[kind] = timings
+    return results
+
+
+def fallback_rate(dishes):
+    """Share of dishes no pairing rule matches, which end up with the generic fallback wines"""
+    rule_index = main.get_pairing_rule_index()
+    unmatched = sum(1 for food_text in dishes if not rule_index.matches(main.analyze_food_input(food_text)))
+    return round(unmatched / len(dishes), 4) if dishes else 0.0
+
+
+def run_fuzzy_suite(size, seed):
+    """Typo-tolerant lookup: per-word cost of the deletion index against a vocabulary scan, and fallback rates"""
+    main.warm_up()
+    fuzzy_index = main.get_fuzzy_match_index()
+    rng = random.Random(f"fuzzy:{seed}")
+    vocabulary = fuzzy_index.vocabulary
+    words = [misspell(rng.choice(vocabulary), rng) for _ in range(size)]
+
+    def scan(word):
+        # What the index saves: comparing the word against every vocabulary word
+        distance = fuzzy_index.allowed_distance(word)
+        if distance:
+            min(vocabulary, key=lambda candidate: main.edit_distance(word, candidate, distance))
+
+    timer = time.perf_counter
+    results = {}
+    for name, lookup in (("index", fuzzy_index._correct), ("scan", scan)):
+        latencies = []
+        for word in words:
+            start = timer()
+            lookup(word)
+            latencies.append(timer() - start)
+        results[name] = summarize(latencies)
+
+    previous = main.get_fuzzy_weight()
+    rates = {}
+    try:
+        for kind in ("misspelled", "short"):
+            dishes = build_corpus(kind, size, seed)
+            for weight in (0.0, previous or main.FUZZY_MATCH_WEIGHT):
+                main.use_fuzzy_weight(weight)
+                reset_memos()
+                rates[f"{kind}_weight_{weight:g}"] = fallback_rate(dishes)
+    finally:
+        main.use_fuzzy_weight(previous)
+    results["fallback_rate"] = rates
+    results["index_size"] = {"vocabulary_words": len(vocabulary), "entries": len(fuzzy_index._deletes)}
+    return results
+
+
+REGIONS = ["Napa Valley", "Sonoma", "Willamette Valley", "Bordeaux", "Burgundy", "Rhône", "Tuscany", "Piedmont",
+           "Rioja", "Mendoza", "Barossa", "Marlborough", "Mosel", "Alsace", "Champagne", "Douro"]
+
+
+def synthetic_catalog(size, seed=0):
+    """Return a reproducible list of size catalog rows over the knowledge base's wines plus a few others"""
+    rng = random.Random(f"catalog:{seed}")
+    varietals = list(main.get_knowledge_base().wine_characteristics) + ["Vermentino", "Grenache", "Tempranillo"]
+    rows = []
+    for number in range(size):
+        varietal = rng.choice(varietals).split("/")[-1]
+        region = rng.choice(REGIONS)
+        price = round(rng.lognormvariate(3.2, 0.6), 2)
+        stock = rng.choice([0, 0, rng.randint(1, 48)])
+        rating = round(rng.uniform(80, 99), 1)
+        rows.append((f"SKU{number:07d}", f"{region} {varietal} {2000 + number % 24}", varietal, price, stock,
+                     region, rating))
+    return rows
+
+
+def run_inventory_suite(size, seed):
+    """Inventory store memory per SKU and top-k in-stock query cost against a full catalog scan"""
+    from inventory import load_inventory
+
+    main.warm_up()
+    rows = synthetic_catalog(size * 20, seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(("sku", "name", "varietal", "price", "stock", "region", "rating"))
+            writer.writerows(rows)
+
+        start = time.perf_counter()
+        load_inventory(path)
+        load_s = time.perf_counter() - start
+
+        # Memory is traced in separate passes; tracemalloc would distort the timing above
+        tracemalloc.start()
+        inventory = load_inventory(path)
+        inventory_bytes = tracemalloc.get_traced_memory()[0]
+        # Baseline: the same catalog kept as one dict per SKU
+        with open(path, newline="", encoding="utf-8") as f:
+            naive = []
+            for values in csv.DictReader(f):
+                values.update(price=float(values["price"]), stock=int(values["stock"]),
+                              rating=float(values["rating"]))
+                naive.append(values)
+        naive_bytes = tracemalloc.get_traced_memory()[0] - inventory_bytes
+        tracemalloc.stop()
+
+    rng = random.Random(f"inventory:{seed}")
+    queries = []
+    for food_text in build_corpus("short", size, seed):
+        wine_scores = [(pairing.wine, pairing.score)
+                       for pairing in main.determine_wine_pairings(main.analyze_food_input(food_text), food_text)]
+        low = rng.choice([None, 10, 20, 30])
+        queries.append((wine_scores, low, None if low is None else low + rng.choice([10, 25, 50])))
+
+    def scan(wine_scores, min_price, max_price):
+        # What the buckets save: filtering and sorting the whole catalog
+        scores = {}
+        for wine, score in wine_scores:
+            for part in wine.split("/"):
+                scores.setdefault(part.casefold(), score)
+        matches = [bottle for bottle in naive if bottle["stock"] and bottle["varietal"].casefold() in scores
+                   and (min_price is None or bottle["price"] >= min_price)
+                   and (max_price is None or bottle["price"] <= max_price)]
+        return heapq.nsmallest(5, matches, key=lambda bottle: (-scores[bottle["varietal"].casefold()],
+                                                               -bottle["rating"], bottle["price"]))
+
+    timer = time.perf_counter
+    results = {"store": {
+        "skus": len(inventory),
+        "load_ms": round(load_s * 1000, 2),
+        "bytes_per_sku": round(inventory.memory_bytes() / len(inventory), 1),
+        "traced_bytes_per_sku": round(inventory_bytes / len(inventory), 1),
+        "dict_rows_bytes_per_sku": round(naive_bytes / len(inventory), 1),
+    }}
+    for name, query in (("top_k", lambda *args: inventory.top_bottles(args[0], 5, args[1], args[2])),
+                        ("scan", scan)):
+        latencies = []
+        for wine_scores, min_price, max_price in queries:
+            start = timer()
+            query(wine_scores, min_price, max_price)
+            latencies.append(timer() - start)
+        results[name] = summarize(latencies)
+    return results
+
+
+def run_menu_suite(size, seed):
+    """Whole-menu optimizer on hundreds of courses: scoring and solve time, and the reported optimality gap"""
+    from menu import optimize_menu
+
+    main.warm_up()
+    results = {}
+    for courses_count in (100, 500):
+        courses = build_corpus("long", courses_count, seed)
+        for budget in (3, 5, 8):
+            for exact in (True, False):
+                start = time.perf_counter()
+                plan = optimize_menu(courses, budget, min_red=1, min_white=1, exact=exact)
+                elapsed = time.perf_counter() - start
+                name = f"courses_{courses_count}_budget_{budget}_{'exact' if exact else 'greedy'}"
+                results[name] = {"total_ms": round(elapsed * 1000, 3), "score_ms": plan["score_ms"],
+                                 "solve_ms": plan["solve_ms"], "gap": plan["gap"], "method": plan["method"]}
+    return results
+
+
+def run_reverse_suite(size, seed):
+    """Wine-to-foods lookups and ranking a dish list for each wine, vectorized against per-dish pairing"""
+    main.warm_up()
+    start = time.perf_counter()
+    index = main.WineFoodIndex(main.get_pairing_rule_index(), main.get_knowledge_base().food_keywords)
+    build_s = time.perf_counter() - start
+    dishes = build_corpus("long", size, seed)
+
+    timer = time.perf_counter
+    lookups = []
+    for wine in index.wines:
+        start = timer()
+        index.foods_for(wine)
+        lookups.append(timer() - start)
+
+    # Both sides rank the same analyzed dishes; analysis is timed once on its own
+    start = timer()
+    category_dicts = main.analyze_many([main.normalize_food_text(food_text) for food_text in dishes])
+    analyze_s = timer() - start
+
+    def brute_force(wine):
+        # What one vectorized pass replaces: the full pairing of every dish, then picking the wine out
+        ranked = []
+        for food_text, food_categories in zip(dishes, category_dicts):
+            for pairing in main.determine_wine_pairings(food_categories, food_text, top_k=None):
+                if pairing.wine == wine:
+                    ranked.append((-pairing.score, food_text))
+        return sorted(ranked)
+
+    results = {"index": {"wines": len(index.wines), "build_ms": round(build_s * 1000, 3),
+                         "dishes": len(dishes), "analyze_ms": round(analyze_s * 1000, 3)},
+               "foods_for": summarize(lookups)}
+    for name, rank in (("rank_dishes", lambda wine: main.dishes_for_wine(wine, dishes, category_dicts=category_dicts)),
+                       ("brute_force", brute_force)):
+        latencies = []
+        for wine in index.wines:
+            start = timer()
+            rank(wine)
+            latencies.append(timer() - start)
+        results[name] = summarize(latencies)
+    return results
+
+
+def keystrokes(dishes, seed):
+    """Yield the text after every keystroke of typing each dish, with the odd typo fixed by backspacing"""
+    rng = random.Random(f"keystrokes:{seed}")
+    for food_text in dishes:
+        typed = ""
+        for char in food_text:
+            if typed and rng.random() < 0.05:
+                yield typed + rng.choice("aeiourstln")
+            typed += char
+            yield typed
+        yield ""
+
+
+def run_typeahead_suite(size, seed):
+    """
+    Per-keystroke cost of the as-you-type view: incremental analysis against analyze_food_input on the whole
+    text, and the full view (analysis, completions and top wines) against the keystroke latency budget
+    """
+    from typeahead import KEYSTROKE_BUDGET_MS, IncrementalAnalysis, TypeaheadSession
+
+    main.warm_up()
+    main.get_keyword_trie()
+    results = {}
+    for kind in ("short", "long"):
+        texts = list(keystrokes(build_corpus(kind, max(1, size // 10), seed), seed))
+        timings = {}
+        for name, update in (("incremental", IncrementalAnalysis().update), ("full", main.analyze_food_input),
+                             ("view", TypeaheadSession().update)):
+            reset_memos()
+            latencies = []
+            for food_text in texts:
+                start = time.perf_counter()
+                update(food_text)
+                latencies.append(time.perf_counter() - start)
+            timings[name] = summarize(latencies)
+        results[kind] = timings
+        results[f"{kind}_budget"] = {"keystrokes": len(texts), "budget_ms": KEYSTROKE_BUDGET_MS,
+                                     "view_p99_ms": timings["view"]["p99_ms"],
+                                     "within_budget": timings["view"]["p99_ms"] <= KEYSTROKE_BUDGET_MS}
+    return results
+
+
+def run_reload_suite(size, seed):
+    """
+    Knowledge base hot reload: rebuild time and peak memory from a JSON source and from a compiled snapshot,
+    and single-dish latency while a rebuild runs in the background against an idle baseline
+    """
+    from knowledge_base import KnowledgeBaseReloader, builtin_tables, write_snapshot
+
+    main.warm_up()
+    dishes = build_corpus("short", size, seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "kb.json")
+        with open(source, "w", encoding="utf-8") as f:
+            json.dump(builtin_tables(), f, ensure_ascii=False)
+        snapshot = os.path.join(directory, "kb.snap")
+        write_snapshot(main.KnowledgeBase(source=source, **builtin_tables()), snapshot)
+
+        for name, path in (("json", source), ("snapshot", snapshot)):
+            # Timed without tracemalloc, which slows allocation down; peak memory is measured in a second pass
+            start = time.perf_counter()
+            KnowledgeBaseReloader(path, prepare=main.prepare_knowledge_base).rebuild()
+            rebuild_s = time.perf_counter() - start
+            _, build = KnowledgeBaseReloader(path, trace_memory=True, prepare=main.prepare_knowledge_base).rebuild()
+            results[name] = {"rebuild_ms": round(rebuild_s * 1000, 3), "peak_memory_kb": build["peak_memory_kb"]}
+
+        def pair_latencies(until):
+            latencies = []
+            for food_text in dishes:
+                start = time.perf_counter()
+                main.determine_wine_pairings(main.analyze_food_input(food_text), food_text)
+                latencies.append(time.perf_counter() - start)
+                if until():
+                    break
+            return latencies
+
+        reset_memos()
+        results["idle"] = summarize(pair_latencies(lambda: False))
+        reset_memos()
+        rebuild = threading.Thread(target=KnowledgeBaseReloader(source, prepare=main.prepare_knowledge_base).rebuild)
+        rebuild.start()
+        results["during_rebuild"] = summarize(pair_latencies(lambda: not rebuild.is_alive()))
+        rebuild.join()
+    return results
+
+
+# Benchmark suites by name; each takes (size, seed) and returns a JSON-ready dict of metrics
+SUITES = {
+    "pipeline": run_pipeline_suite,
+    "analyzers": run_analyzer_suite,
+    "fuzzy": run_fuzzy_suite,
+    "inventory": run_inventory_suite,
+    "menu": run_menu_suite,
+    "reverse": run_reverse_suite,
+    "typeahead": run_typeahead_suite,
+    "reload": run_reload_suite,
+}
+
+
+def flatten_metrics(results, prefix=""):
+    """Flatten nested results into {"suite.kind.stage.metric": value} for comparison"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Compare two runs and return (metric, baseline, current, change) for every metric that got worse by more
+    than threshold: latencies and memory that grew, throughput that dropped
+    """
+    current = flatten_metrics(results["suites"])
+    previous = flatten_metrics(baseline["suites"])
+    regressions = []
+    for name, old in previous.items():
+        new = current.get(name)
+        if new is None or not old:
+            continue
+        if name.endswith(("_ms", "_kb")):
+            change = (new - old) / old
+        elif name.endswith("throughput_per_s"):
+            change = (old - new) / old
+        else:
+            continue
+        if change > threshold:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def find_budget_misses(results):
+    """Return the names of latency budgets a run missed (results reporting within_budget false)"""
+    return [name.rsplit(".", 1)[0] for name, value in flatten_metrics(results["suites"]).items()
+            if name.endswith(".within_budget") and not value]
+
+
+def print_report(results):
+    """Print a human-readable summary of a run"""
+    for suite, suite_results in results["suites"].items():
+        print(f"\n=== {suite} ===")
+        for group, metrics in suite_results.items():
+            print(f"\n{group}:")
+            for stage, values in metrics.items():
+                if isinstance(values, dict):
+                    print(f"  {stage:<10} {values['throughput_per_s']:>12.1f}/s  p50 {values['p50_ms']:.4f} ms  "
+                          f"p95 {values['p95_ms']:.4f} ms  p99 {values['p99_ms']:.4f} ms")
+                else:
+                    print(f"  {stage:<10} {values}")
+
+
+def main_benchmark(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the wine pairing engine")
+    parser.add_argument("--size", type=int, default=1000, help="Dishes per corpus (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0)")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES),
+                        help="Suite to run; repeat for several (default: all)")
+    parser.add_argument("--output", metavar="FILE", help="Write machine-readable results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="Earlier results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown that counts as a regression (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": args.size,
+            "seed": args.seed,
+            "knowledge_base": main.knowledge_base_fingerprint(),
+        },
+        "suites": {},
+    }
+    for suite in args.suite or list(SUITES):
+        results["suites"][suite] = SUITES[suite](args.size, args.seed)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    status = 0
+    misses = find_budget_misses(results)
+    if misses:
+        print(f"\nOver latency budget: {', '.join(misses)}")
+        status = 1
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for name, old, new, change in regressions:
+                print(f"- {name}: {old} -> {new} ({change:+.1%})")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
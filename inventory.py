@@ -0,0 +1,259 @@
+"""
+Bottle inventory: maps recommended varietals to the bottles actually in the cellar
+
+A catalog is a CSV file or an sqlite database (table "inventory") with one row per SKU:
+
+    sku,name,varietal,price,stock,region[,rating]
+
+Varietals are matched to recommended wines case- and accent-insensitively, and either half of a name like
+"Syrah/Shiraz" matches. Rows are packed into parallel typed arrays and one UTF-8 blob instead of an object
+per bottle, and bucketed by varietal and price band with each bucket presorted best-first. A query merges
+only the buckets of the recommended varietals that overlap the price range and stops after k in-stock
+bottles, however large the catalog is.
+"""
+import csv
+import heapq
+import os
+import sqlite3
+import unicodedata
+from array import array
+from bisect import bisect_right
+
+from model import SQLITE_SUFFIXES
+
+# Lower edges of the price bands bottles are bucketed by, in the catalog's currency
+PRICE_BANDS = (0, 10, 15, 20, 30, 45, 70, 100, 200)
+CATALOG_COLUMNS = ("sku", "name", "varietal", "price", "stock", "region")
+
+
+def varietal_key(name):
+    """Normalize a varietal name for matching: accents stripped, case folded, whitespace collapsed"""
+    decomposed = unicodedata.normalize("NFKD", name)
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+
+class Bottle:
+    """One bottle returned by an inventory query, with the pairing score of its wine"""
+    __slots__ = ("sku", "name", "varietal", "price", "stock", "region", "rating", "score")
+
+    def __init__(self, sku, name, varietal, price, stock, region, rating, score):
+        self.sku = sku
+        self.name = name
+        self.varietal = varietal
+        self.price = price
+        self.stock = stock
+        self.region = region
+        self.rating = rating
+        self.score = score
+
+    def to_dict(self):
+        """Return the bottle as a JSON-ready dict"""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"Bottle({self.sku!r}, {self.name!r}, {self.price!r})"
+
+
+class Inventory:
+    """
+    Compact, queryable store of catalog rows
+    rows yields (sku, name, varietal, price, stock, region, rating) tuples
+    """
+
+    def __init__(self, rows, price_bands=PRICE_BANDS):
+        self.price_bands = tuple(price_bands)
+        self._band_edges = [round(edge * 100) for edge in self.price_bands]
+
+        # Varietal and region names are interned into small tables and stored per row as ids
+        self.varietals = []
+        self.regions = []
+        self._varietal_ids = {}
+        region_ids = {}
+
+        self._price = array("I")     # cents
+        self._stock = array("I")
+        self._rating = array("f")
+        self._varietal = array("H")
+        self._region = array("H")
+        # SKU and name of row i are _text[_offsets[2i]:_offsets[2i+1]] and [_offsets[2i+1]:_offsets[2i+2]]
+        self._offsets = array("I", [0])
+        text = bytearray()
+
+        # Catalogs repeat a handful of varietal spellings; normalize each spelling once
+        spelling_ids = {}
+        for sku, name, varietal, price, stock, region, rating in rows:
+            varietal_id = spelling_ids.get(varietal)
+            if varietal_id is None:
+                key = varietal_key(varietal)
+                if key not in self._varietal_ids:
+                    self._varietal_ids[key] = len(self.varietals)
+                    self.varietals.append(varietal)
+                varietal_id = spelling_ids[varietal] = self._varietal_ids[key]
+            if region not in region_ids:
+                region_ids[region] = len(self.regions)
+                self.regions.append(region)
+            self._price.append(round(price * 100))
+            self._stock.append(stock)
+            self._rating.append(rating)
+            self._varietal.append(varietal_id)
+            self._region.append(region_ids[region])
+            text += sku.encode("utf-8")
+            self._offsets.append(len(text))
+            text += name.encode("utf-8")
+            self._offsets.append(len(text))
+        self._text = bytes(text)
+
+        # (varietal id, price band) -> row ids, best first: higher rating, then lower price
+        grouped = {}
+        for row in range(len(self._price)):
+            grouped.setdefault((self._varietal[row], self.band_of(self._price[row])), []).append(row)
+        self._buckets = {
+            bucket: array("I", sorted(bucket_rows, key=lambda row: (-self._rating[row], self._price[row], row)))
+            for bucket, bucket_rows in grouped.items()
+        }
+        self._sku_rows = None
+        self._wine_varietals = {}
+
+    def __len__(self):
+        return len(self._price)
+
+    def band_of(self, cents):
+        """Return the index of the price band a price in cents falls in"""
+        return max(0, bisect_right(self._band_edges, cents) - 1)
+
+    def memory_bytes(self):
+        """Approximate bytes held by the per-row arrays, the text blob and the bucket index"""
+        arrays = [self._price, self._stock, self._rating, self._varietal, self._region, self._offsets]
+        arrays.extend(self._buckets.values())
+        return len(self._text) + sum(values.itemsize * len(values) for values in arrays)
+
+    def varietals_for(self, wine):
+        """Return the ids of the catalog varietals that stand for a recommended wine"""
+        varietal_ids = self._wine_varietals.get(wine)
+        if varietal_ids is None:
+            keys = [varietal_key(wine)] + [varietal_key(part) for part in wine.split("/")]
+            varietal_ids = tuple(dict.fromkeys(self._varietal_ids[key] for key in keys if key in self._varietal_ids))
+            self._wine_varietals[wine] = varietal_ids
+        return varietal_ids
+
+    def bottle(self, row, score=None):
+        """Materialize one row as a Bottle"""
+        offsets = self._offsets
+        return Bottle(
+            sku=self._text[offsets[2 * row]:offsets[2 * row + 1]].decode("utf-8"),
+            name=self._text[offsets[2 * row + 1]:offsets[2 * row + 2]].decode("utf-8"),
+            varietal=self.varietals[self._varietal[row]],
+            price=self._price[row] / 100,
+            stock=self._stock[row],
+            region=self.regions[self._region[row]],
+            rating=round(self._rating[row], 2),
+            score=score,
+        )
+
+    def top_bottles(self, wine_scores, k=5, min_price=None, max_price=None):
+        """
+        Return up to k in-stock bottles of the recommended wines priced within [min_price, max_price]
+        wine_scores lists (wine, pairing score) pairs. Bottles are ranked by their wine's score, then
+        rating, then lower price, and ties go to the wine recommended first.
+        """
+        if k <= 0:
+            return []
+        min_cents = 0 if min_price is None else round(min_price * 100)
+        max_cents = None if max_price is None else round(max_price * 100)
+        first_band = self.band_of(min_cents)
+        last_band = len(self._band_edges) - 1 if max_cents is None else self.band_of(max_cents)
+
+        # Every bucket is already sorted by (rating, price), so prefixing the wine's score keeps each stream
+        # sorted and a lazy k-way merge yields bottles in final order
+        streams = []
+        for order, (wine, score) in enumerate(wine_scores):
+            for varietal_id in self.varietals_for(wine):
+                for band in range(first_band, last_band + 1):
+                    rows = self._buckets.get((varietal_id, band))
+                    if rows:
+                        streams.append(self._ranked(rows, score, order))
+
+        bottles = []
+        seen = set()
+        price, stock = self._price, self._stock
+        for _, _, _, _, row, score in heapq.merge(*streams):
+            if not stock[row] or row in seen or price[row] < min_cents:
+                continue
+            if max_cents is not None and price[row] > max_cents:
+                continue
+            seen.add(row)
+            bottles.append(self.bottle(row, score))
+            if len(bottles) >= k:
+                break
+        return bottles
+
+    def _ranked(self, rows, score, order):
+        """Yield merge keys for one presorted bucket"""
+        rating, price = self._rating, self._price
+        for row in rows:
+            yield -score, -rating[row], price[row], order, row, score
+
+    def set_stock(self, sku, count):
+        """Update the stock count of a SKU"""
+        if self._sku_rows is None:
+            # Built on first use; most runs only query
+            self._sku_rows = {self.bottle(row).sku: row for row in range(len(self))}
+        try:
+            self._stock[self._sku_rows[sku]] = count
+        except KeyError:
+            raise ValueError(f"Unknown SKU: {sku}")
+
+
+def parse_row(values, where):
+    """Convert one catalog row's raw values into a typed row tuple, raising ValueError on bad data"""
+    missing = [column for column in CATALOG_COLUMNS if values.get(column) in (None, "")]
+    if missing:
+        raise ValueError(f"{where}: missing {', '.join(missing)}")
+    try:
+        price = float(values["price"])
+        stock = int(values["stock"])
+        rating = float(values.get("rating") or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: price, stock and rating must be numbers")
+    if price < 0 or stock < 0:
+        raise ValueError(f"{where}: price and stock cannot be negative")
+    return (str(values["sku"]), str(values["name"]), str(values["varietal"]), price, stock,
+            str(values["region"]), rating)
+
+
+def read_catalog_rows(path):
+    """Yield typed rows from a CSV or sqlite catalog"""
+    if os.path.splitext(path)[1].lower() in SQLITE_SUFFIXES:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        connection.row_factory = sqlite3.Row
+        try:
+            for number, row in enumerate(connection.execute("SELECT * FROM inventory ORDER BY rowid"), 1):
+                yield parse_row(dict(row), f"{path} row {number}")
+        finally:
+            connection.close()
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in CATALOG_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"{path} is missing catalog columns: {', '.join(missing)}")
+        for values in reader:
+            yield parse_row(values, f"{path} line {reader.line_num}")
+
+
+def load_inventory(path, price_bands=PRICE_BANDS):
+    """Load a CSV or sqlite catalog into an Inventory"""
+    return Inventory(read_catalog_rows(path), price_bands)
+
+
+def print_bottles(bottles):
+    """Print in-stock bottles below the recommendations"""
+    print("=== In Stock ===\n")
+    if not bottles:
+        print("   No matching bottles in stock\n")
+        return
+    for bottle in bottles:
+        print(f"- {bottle.name} ({bottle.varietal}, {bottle.region})")
+        print(f"   ${bottle.price:.2f}, {bottle.stock} in stock, SKU {bottle.sku}")
+    print("")
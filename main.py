@@ -1,344 +1,470 @@
 import argparse
+import heapq
+import json
+import sqlite3
+import sys
 import textwrap
+import threading
+import time
 import re
-from collections import defaultdict
-
-# Wine characteristics database
-WINE_CHARACTERISTICS = {
-    "Cabernet Sauvignon": {
-        "body": "full",
-        "tannins": "high",
-        "acidity": "medium-high",
-        "flavors": ["black currant", "black cherry", "cedar", "graphite"],
-        "pairings": ["rich meats", "steak", "lamb", "strong cheeses"],
-        "characteristics": ["robust", "structured", "powerful"]
-    },
-    "Merlot": {
-        "body": "medium-full",
-        "tannins": "medium",
-        "acidity": "medium",
-        "flavors": ["plum", "black cherry", "chocolate", "herbs"],
-        "pairings": ["pizza", "pasta", "grilled meats", "burgers"],
-        "characteristics": ["smooth", "approachable", "fruit-forward"]
-    },
-    "Pinot Noir": {
-        "body": "light-medium",
-        "tannins": "low-medium",
-        "acidity": "medium-high",
-        "flavors": ["red cherry", "strawberry", "mushroom", "forest floor"],
-        "pairings": ["salmon", "roasted chicken", "duck", "mushroom dishes"],
-        "characteristics": ["elegant", "silky", "subtle"]
-    },
-    "Syrah/Shiraz": {
-        "body": "full",
-        "tannins": "medium-high",
-        "acidity": "medium",
-        "flavors": ["blackberry", "black pepper", "smoke", "licorice"],
-        "pairings": ["barbecue", "grilled meats", "spicy dishes", "stews"],
-        "characteristics": ["bold", "peppery", "dark"]
-    },
-    "Zinfandel": {
-        "body": "medium-full",
-        "tannins": "medium",
-        "acidity": "medium-high",
-        "flavors": ["raspberry", "blackberry", "pepper", "spice"],
-        "pairings": ["pizza", "pasta", "barbecue", "burgers", "spicy foods"],
-        "characteristics": ["jammy", "spicy", "bold"]
-    },
-    "Malbec": {
-        "body": "medium-full",
-        "tannins": "medium",
-        "acidity": "medium",
-        "flavors": ["blackberry", "plum", "chocolate", "tobacco"],
-        "pairings": ["steak", "barbecue", "spicy foods", "mexican cuisine"],
-        "characteristics": ["plush", "velvety", "fruit-forward"]
-    },
-    "Chardonnay": {
-        "body": "medium-full",
-        "tannins": "none",
-        "acidity": "medium",
-        "flavors": ["apple", "pear", "vanilla", "butter"],
-        "pairings": ["creamy pasta", "lobster", "roasted chicken", "creamy sauces"],
-        "characteristics": ["rich", "creamy", "versatile"]
-    },
-    "Sauvignon Blanc": {
-        "body": "light-medium",
-        "tannins": "none",
-        "acidity": "high",
-        "flavors": ["grapefruit", "green apple", "grass", "herbs"],
-        "pairings": ["salads", "fish", "goat cheese", "vegetable dishes"],
-        "characteristics": ["crisp", "herbaceous", "zesty"]
-    },
-    "Riesling": {
-        "body": "light-medium",
-        "tannins": "none",
-        "acidity": "high",
-        "flavors": ["peach", "apricot", "honey", "petrol"],
-        "pairings": ["spicy foods", "asian cuisine", "pork", "sushi"],
-        "characteristics": ["aromatic", "fruity", "varying sweetness"]
-    },
-    "Pinot Grigio": {
-        "body": "light",
-        "tannins": "none",
-        "acidity": "medium-high",
-        "flavors": ["pear", "apple", "lemon", "almond"],
-        "pairings": ["light seafood", "salads", "light pasta", "appetizers"],
-        "characteristics": ["crisp", "light", "refreshing"]
-    },
-    "Sangiovese": {
-        "body": "medium",
-        "tannins": "medium-high",
-        "acidity": "high",
-        "flavors": ["cherry", "plum", "herbs", "tea"],
-        "pairings": ["tomato-based pasta", "pizza", "italian cuisine", "cured meats"],
-        "characteristics": ["savory", "earthy", "rustic"]
-    },
-    "Nebbiolo": {
-        "body": "medium-full",
-        "tannins": "high",
-        "acidity": "high",
-        "flavors": ["cherry", "rose", "tar", "licorice"],
-        "pairings": ["rich pasta", "truffle dishes", "aged cheeses", "risotto"],
-        "characteristics": ["complex", "powerful", "elegant"]
-    },
-    "Barbera": {
-        "body": "medium",
-        "tannins": "low",
-        "acidity": "high",
-        "flavors": ["cherry", "strawberry", "plum", "herbs"],
-        "pairings": ["tomato-based pasta", "pizza", "eggplant", "italian cuisine"],
-        "characteristics": ["juicy", "vibrant", "food-friendly"]
-    },
-    "Gewürztraminer": {
-        "body": "medium",
-        "tannins": "none",
-        "acidity": "low-medium",
-        "flavors": ["lychee", "rose", "ginger", "spice"],
-        "pairings": ["spicy asian cuisine", "thai food", "indian cuisine", "aromatic dishes"],
-        "characteristics": ["aromatic", "floral", "spicy"]
-    },
-    "Dessert Wine": {
-        "body": "full",
-        "tannins": "varies",
-        "acidity": "high",
-        "flavors": ["honey", "caramel", "dried fruit", "nuts"],
-        "pairings": ["desserts", "cheese", "fruit", "chocolate", "nuts"],
-        "characteristics": ["sweet", "complex", "concentrated"]
-    },
-    "Sparkling Wine": {
-        "body": "light",
-        "tannins": "none",
-        "acidity": "high",
-        "flavors": ["apple", "citrus", "toast", "brioche"],
-        "pairings": ["appetizers", "seafood", "fried foods", "celebrations"],
-        "characteristics": ["effervescent", "crisp", "celebratory"]
-    },
-    "Rosé": {
-        "body": "light-medium",
-        "tannins": "low",
-        "acidity": "medium-high",
-        "flavors": ["strawberry", "watermelon", "citrus", "flowers"],
-        "pairings": ["salads", "light pastas", "grilled fish", "vegetable dishes"],
-        "characteristics": ["refreshing", "versatile", "fruity"]
-    }
-}
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 
-# Food keywords and related terms - expanded with more terms and associations
-FOOD_KEYWORDS = {
-    # Pasta types and dishes
-    "pasta": ["pasta", "spaghetti", "fettuccine", "linguine", "penne", "rigatoni", "farfalle",
-              "lasagna", "ravioli", "tortellini", "macaroni", "tagliatelle", "orzo", "noodle"],
-    "pizza": ["pizza", "flatbread", "calzone", "stromboli"],
-
-    # Pasta sauces and preparations
-    "tomato": ["tomato", "marinara", "pomodoro", "arrabbiata", "red sauce", "bolognese", "amatriciana"],
-    "cream": ["cream", "alfredo", "carbonara", "bechamel", "white sauce", "beurre blanc", "creamy"],
-    "vodka": ["vodka", "vodka sauce", "pink sauce", "rosé sauce"],
-    "pesto": ["pesto", "basil sauce", "herb sauce", "green sauce"],
-    "oil": ["oil", "olive oil", "aglio e olio", "garlic oil"],
-
-    # Meats
-    "beef": ["beef", "steak", "brisket", "short rib", "ground beef", "meatball", "meatloaf", "hamburger"],
-    "pork": ["pork", "ham", "bacon", "prosciutto", "pancetta", "sausage", "salami", "chorizo", "loin"],
-    "lamb": ["lamb", "mutton", "rack of lamb", "lamb chop", "leg of lamb"],
-    "chicken": ["chicken", "poultry", "turkey", "duck", "cornish hen", "quail", "fowl", "bird"],
-
-    # Seafood
-    "fish": ["fish", "salmon", "tuna", "cod", "trout", "halibut", "tilapia", "sea bass", "swordfish"],
-    "shellfish": ["shellfish", "shrimp", "lobster", "crab", "scallop", "clam", "mussel", "oyster"],
-
-    # Cooking methods
-    "grilled": ["grill", "grilled", "barbecue", "bbq", "charred", "charcoal", "smoky", "flame-cooked"],
-    "roasted": ["roast", "roasted", "baked", "oven", "broiled"],
-    "fried": ["fried", "deep-fried", "pan-fried", "crispy", "tempura"],
-    "braised": ["braise", "braised", "slow-cooked", "stewed"],
-
-    # Flavors and seasonings
-    "spicy": ["spicy", "hot", "chili", "pepper", "cajun", "sriracha", "jalapeno", "paprika", "curry"],
-    "herbs": ["herb", "basil", "oregano", "thyme", "rosemary", "parsley", "mint", "cilantro", "dill"],
-    "garlic": ["garlic", "shallot", "onion", "leek"],
-    "cheese": ["cheese", "parmesan", "mozzarella", "cheddar", "gouda", "ricotta", "goat cheese", "blue cheese"],
-
-    # Cuisines
-    "italian": ["italian", "italy", "mediterranean", "tuscan", "sicilian", "roman"],
-    "french": ["french", "france", "provencal", "bistro"],
-    "asian": ["asian", "chinese", "japanese", "thai", "vietnamese", "korean", "soy sauce", "ginger", "teriyaki"],
-    "mexican": ["mexican", "taco", "burrito", "enchilada", "salsa", "guacamole", "tortilla", "quesadilla"],
-    "indian": ["indian", "curry", "tandoori", "masala", "korma", "tikka", "naan"],
-    "mediterranean": ["mediterranean", "greek", "middle eastern", "lebanese", "moroccan"],
-
-    # Vegetables
-    "mushroom": ["mushroom", "fungi", "portobello", "shiitake", "truffle", "porcini", "cremini"],
-    "vegetable": ["vegetable", "vegetarian", "vegan", "plant-based", "meatless", "greens"],
-
-    # Sweet things
-    "dessert": ["dessert", "cake", "pie", "pastry", "tart", "sweet", "chocolate", "custard", "pudding"],
-    "fruit": ["fruit", "berry", "apple", "pear", "peach", "cherry", "strawberry", "raspberry", "blueberry",
-              "blackberry", "citrus", "lemon", "orange", "grapefruit", "tropical", "mango", "pineapple"],
-    "chocolate": ["chocolate", "cocoa", "fudge", "ganache", "brownie", "truffle"],
-    "caramel": ["caramel", "toffee", "butterscotch", "dulce de leche"],
-    "nuts": ["nut", "almond", "walnut", "pecan", "hazelnut", "pistachio", "peanut"],
-
-    # Misc food types
-    "appetizer": ["appetizer", "starter", "hors d'oeuvre", "tapas", "small plate", "finger food"],
-    "salad": ["salad", "greens", "vinaigrette", "slaw", "cold dish"],
-    "soup": ["soup", "stew", "broth", "bisque", "chowder", "gumbo"],
-    "sandwich": ["sandwich", "burger", "sub", "wrap", "panini", "toast"],
-    "breakfast": ["breakfast", "brunch", "eggs", "pancake", "waffle", "bacon", "sausage", "omelette"]
-}
+from model import (DEFAULT_WINES, FOOD_KEYWORDS, WINE_CHARACTERISTICS, WINE_PAIRING_RULES, FuzzyMatchIndex,
+                   KeywordMatcher, KeywordTrie, KnowledgeBase, PairingRuleIndex, PartialMatchIndex, WineFoodIndex,
+                   active_knowledge_base, deletes, edit_distance, get_knowledge_base, pinned_knowledge_base,
+                   use_knowledge_base)
+
+
+def get_keyword_matcher():
+    """Return the active knowledge base's keyword matcher, building it on first use"""
+    return get_knowledge_base().keyword_matcher
+
+
+def get_partial_match_index():
+    """Return the active knowledge base's partial-match index, building it on first use"""
+    return get_knowledge_base().partial_match_index
+
+
+def get_fuzzy_match_index():
+    """Return the active knowledge base's typo-tolerant lookup index, building it on first use"""
+    return get_knowledge_base().fuzzy_match_index
+
+
+def get_keyword_trie():
+    """Return the active knowledge base's keyword completion trie, building it on first use"""
+    return get_knowledge_base().keyword_trie
+
+
+def get_pairing_rule_index():
+    """Return the active knowledge base's pairing rule index, compiling it on first use"""
+    return get_knowledge_base().pairing_rule_index
+
+
+def get_wine_food_index():
+    """Return the active knowledge base's wine-to-foods index, building it on first use"""
+    return get_knowledge_base().wine_food_index
+
+
+def get_vectorized_scorer(knowledge_base=None):
+    """
+    Return the NumPy scoring engine of a knowledge base (by default the one in use), building it on first use
+    It is built from the rule index rather than snapshotted; it only needs numpy and takes milliseconds
+    """
+    knowledge_base = knowledge_base or get_knowledge_base()
+    return knowledge_base.section("vectorized", lambda: VectorizedScorer(knowledge_base.pairing_rule_index,
+                                                                         knowledge_base.keyword_matcher.categories))
+
+
+class PipelineProfiler:
+    """
+    Per-stage timings and counters for the pairing pipeline
+    Installed with use_profiler(); while none is installed each instrumented stage only checks a global
+    for None, so the pipeline runs at full speed
+    """
+    # Stages in pipeline order, for reports
+    STAGES = ("analyze.tokenize", "analyze.exact", "analyze.partial", "analyze.fuzzy", "pairings.combo",
+              "pairings.single", "pairings.fallback", "pairings.rank", "pairings.vectorized", "render", "batch")
+    # Stages of determine_wine_pairings, which the numpy engine also runs for dishes no rule matches
+    RULE_STAGES = ("pairings.combo", "pairings.single", "pairings.fallback", "pairings.rank")
+
+    def __init__(self):
+        self.stage_calls = defaultdict(int)
+        self.stage_seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+
+    def record(self, stage, seconds):
+        """Add one timed call of a stage"""
+        self.stage_calls[stage] += 1
+        self.stage_seconds[stage] += seconds
+
+    def count(self, counter, amount=1):
+        """Increment a counter"""
+        self.counters[counter] += amount
+
+    def seconds(self, stages):
+        """Return the time recorded so far under any of the given stages"""
+        return sum(self.stage_seconds.get(stage, 0.0) for stage in stages)
+
+    def snapshot(self):
+        """Return the timings and counters as a JSON-ready dict"""
+        return {
+            "stages": {stage: {"calls": self.stage_calls[stage], "seconds": self.stage_seconds[stage]}
+                       for stage in self._stage_order()},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def merge(self, snapshot):
+        """Fold in a snapshot taken elsewhere, e.g. in a pool worker"""
+        for stage, values in snapshot["stages"].items():
+            self.stage_calls[stage] += values["calls"]
+            self.stage_seconds[stage] += values["seconds"]
+        for counter, amount in snapshot["counters"].items():
+            self.counters[counter] += amount
+
+    def _stage_order(self):
+        known = [stage for stage in self.STAGES if stage in self.stage_calls]
+        return known + sorted(set(self.stage_calls) - set(self.STAGES))
+
+    def report(self):
+        """Return a human-readable table of stage timings followed by the counters"""
+        # Share of pipeline time; the batch stage is wall time around everything else, so it is left out
+        pipeline_seconds = sum(seconds for stage, seconds in self.stage_seconds.items() if stage != "batch")
+        lines = [f"{'stage':<20} {'calls':>9} {'total ms':>11} {'mean us':>10} {'share':>7}"]
+        for stage in self._stage_order():
+            calls, seconds = self.stage_calls[stage], self.stage_seconds[stage]
+            share = f"{seconds / pipeline_seconds:.1%}" if pipeline_seconds and stage != "batch" else ""
+            lines.append(f"{stage:<20} {calls:>9} {seconds * 1000:>11.2f} {seconds / calls * 1e6:>10.1f} {share:>7}")
+        for counter, amount in sorted(self.counters.items()):
+            lines.append(f"{counter:<20} {amount:>9}")
+        return "\n".join(lines)
+
+
+_profiler = None
 
-# Wine pairing rules - expanded with more combinations
-WINE_PAIRING_RULES = {
-    # Pasta combinations
-    "pasta + tomato": ["Sangiovese", "Barbera", "Pinot Noir", "Zinfandel", "Merlot"],
-    "pasta + cream": ["Chardonnay", "Pinot Grigio", "Pinot Noir", "Merlot"],
-    "pasta + vodka": ["Barbera", "Sangiovese", "Pinot Noir", "Sauvignon Blanc", "Zinfandel"],
-    "pasta + pesto": ["Sauvignon Blanc", "Pinot Grigio", "Vermentino"],
-    "pasta + oil": ["Pinot Grigio", "Sauvignon Blanc", "Chardonnay"],
-    "pasta + mushroom": ["Pinot Noir", "Nebbiolo", "Chardonnay"],
-
-    # Pizza
-    "pizza": ["Sangiovese", "Barbera", "Zinfandel", "Merlot"],
-    "pizza + spicy": ["Zinfandel", "Syrah/Shiraz", "Malbec"],
-
-    # Meat dishes
-    "beef": ["Cabernet Sauvignon", "Malbec", "Syrah/Shiraz", "Zinfandel"],
-    "pork": ["Pinot Noir", "Merlot", "Zinfandel", "Riesling"],
-    "lamb": ["Cabernet Sauvignon", "Syrah/Shiraz", "Malbec", "Nebbiolo"],
-    "chicken": ["Chardonnay", "Pinot Noir", "Sauvignon Blanc", "Merlot"],
-
-    # Seafood
-    "fish": ["Pinot Grigio", "Sauvignon Blanc", "Chardonnay", "Pinot Noir"],
-    "shellfish": ["Pinot Grigio", "Sauvignon Blanc", "Chardonnay", "Riesling"],
-
-    # Cooking methods
-    "grilled": ["Zinfandel", "Syrah/Shiraz", "Malbec", "Cabernet Sauvignon"],
-    "roasted": ["Pinot Noir", "Merlot", "Chardonnay", "Cabernet Sauvignon"],
-    "fried": ["Chardonnay", "Pinot Grigio", "Sauvignon Blanc", "Sparkling Wine"],
-    "braised": ["Cabernet Sauvignon", "Syrah/Shiraz", "Nebbiolo", "Malbec"],
-
-    # Flavors and ingredients
-    "spicy": ["Riesling", "Gewürztraminer", "Zinfandel", "Syrah/Shiraz"],
-    "garlic": ["Sauvignon Blanc", "Pinot Grigio", "Chardonnay"],
-    "cheese": ["Cabernet Sauvignon", "Chardonnay", "Merlot", "Pinot Noir"],
-    "mushroom": ["Pinot Noir", "Nebbiolo", "Chardonnay", "Merlot"],
-
-    # Cuisines
-    "italian": ["Sangiovese", "Barbera", "Nebbiolo", "Pinot Grigio"],
-    "french": ["Pinot Noir", "Chardonnay", "Cabernet Sauvignon", "Sauvignon Blanc"],
-    "asian": ["Riesling", "Gewürztraminer", "Sauvignon Blanc", "Pinot Noir"],
-    "mexican": ["Malbec", "Zinfandel", "Sauvignon Blanc", "Riesling"],
-    "indian": ["Riesling", "Gewürztraminer", "Syrah/Shiraz", "Pinot Noir"],
-    "mediterranean": ["Sangiovese", "Pinot Grigio", "Syrah/Shiraz"],
-
-    # Sweet and dessert pairings
-    "dessert": ["Dessert Wine", "Riesling", "Gewürztraminer"],
-    "fruit": ["Riesling", "Gewürztraminer", "Dessert Wine", "Sparkling Wine", "Rosé"],
-    "chocolate": ["Dessert Wine", "Syrah/Shiraz", "Zinfandel", "Cabernet Sauvignon"],
-    "caramel": ["Dessert Wine", "Chardonnay"],
-    "nuts": ["Dessert Wine", "Chardonnay", "Merlot"],
-
-    # Misc food types
-    "appetizer": ["Sparkling Wine", "Sauvignon Blanc", "Pinot Grigio", "Rosé"],
-    "salad": ["Sauvignon Blanc", "Pinot Grigio", "Rosé"],
-    "soup": ["Chardonnay", "Sauvignon Blanc", "Pinot Noir"],
-    "sandwich": ["Zinfandel", "Merlot", "Chardonnay"],
-    "breakfast": ["Sparkling Wine", "Riesling", "Sauvignon Blanc"]
-}
 
-# Default wine pairings for when no specific match is found
-DEFAULT_WINES = {
-    "red": ["Merlot", "Pinot Noir", "Cabernet Sauvignon"],
-    "white": ["Chardonnay", "Sauvignon Blanc", "Pinot Grigio"],
-    "versatile": ["Pinot Noir", "Chardonnay", "Rosé", "Riesling"]
+def get_profiler():
+    """Return the installed profiler, or None when profiling is off"""
+    return _profiler
+
+
+def use_profiler(profiler):
+    """Install a PipelineProfiler for the pipeline to report into, or None to turn profiling off"""
+    global _profiler
+    _profiler = profiler
+    return profiler
+
+
+class RegexAnalyzer:
+    """
+    Default analyzer: keywords are matched in the lowercased text and its regex word tokens are used for
+    partial matching
+    """
+    name = "regex"
+
+    def terms(self, food_text):
+        """Return (texts to match keywords in, words to partially match) for one dish"""
+        food_text = food_text.lower()
+        return [food_text], re.findall(r'\b\w+\b', food_text)
+
+    def terms_many(self, food_texts):
+        """Return terms() for each of a batch of dishes"""
+        return [self.terms(food_text) for food_text in food_texts]
+
+
+class SpacyAnalyzer:
+    """
+    Lemmatizing analyzer backed by spaCy, so inflections like "mussels", "grilling" and "braising" reach
+    their keywords. Keywords are matched in both the text and its lemmas; the lemmas are used for partial
+    matching. spaCy and the model are only imported on first use, keeping them off the CLI's startup path.
+    """
+    name = "spacy"
+    # Components the lemmatizer does not depend on; they are not loaded at all
+    UNUSED_PIPES = ("parser", "ner", "senter", "textcat")
+
+    def __init__(self, model="en_core_web_sm", batch_size=256):
+        self.model = model
+        self.batch_size = batch_size
+        self._nlp = None
+
+    def pipeline(self):
+        """Return the spaCy pipeline, loading it on first use"""
+        if self._nlp is None:
+            try:
+                import spacy
+            except ImportError as e:
+                raise ImportError("The spacy analyzer needs spaCy; install it with pip install -r requirements.txt") from e
+            try:
+                self._nlp = spacy.load(self.model, exclude=list(self.UNUSED_PIPES))
+            except OSError as e:
+                raise OSError(f"The spacy analyzer needs the {self.model} model; "
+                              f"install it with pip install -r requirements.txt") from e
+        return self._nlp
+
+    def terms(self, food_text):
+        """Return (texts to match keywords in, words to partially match) for one dish"""
+        return self.terms_many([food_text])[0]
+
+    def terms_many(self, food_texts):
+        """Return terms() for each of a batch of dishes, lemmatizing them together through nlp.pipe"""
+        lowered = [food_text.lower() for food_text in food_texts]
+        results = []
+        for food_text, doc in zip(lowered, self.pipeline().pipe(lowered, batch_size=self.batch_size)):
+            lemma_text = " ".join((token.lemma_ or token.text).lower() for token in doc if not token.is_space)
+            results.append(([food_text, lemma_text], re.findall(r'\b\w+\b', lemma_text)))
+        return results
+
+
+ANALYZERS = {
+    "regex": RegexAnalyzer,
+    "spacy": SpacyAnalyzer,
 }
 
+_analyzer = None
 
-def analyze_food_input(food_text):
+
+def get_analyzer():
+    """Return the active analyzer backend, defaulting to the regex tokenizer"""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = RegexAnalyzer()
+    return _analyzer
+
+
+def use_analyzer(analyzer):
+    """Select the analyzer backend by name ("regex" or "spacy") or instance"""
+    global _analyzer
+    _analyzer = ANALYZERS[analyzer]() if isinstance(analyzer, str) else analyzer
+    return _analyzer
+
+
+# Score of each keyword listing found only after correcting typos; 0 turns typo-tolerant lookup off
+FUZZY_MATCH_WEIGHT = 0.8
+# Wine scores are rounded to this many decimals. Fuzzy weights such as 0.8 are not exact in binary, so the
+# same total summed in a different order (the numpy engine's matrix products) can differ in the last bit;
+# rounding both engines the same way keeps their scores and tie order identical
+SCORE_DECIMALS = 9
+SCORE_SCALE = 10 ** SCORE_DECIMALS
+
+
+def quantize_score(score):
+    """Round a wine score to SCORE_DECIMALS the way the numpy engine does (round half to even)"""
+    return round(score * SCORE_SCALE) / SCORE_SCALE
+
+
+_fuzzy_weight = FUZZY_MATCH_WEIGHT
+
+
+def get_fuzzy_weight():
+    """Return the score given to keywords found through typo correction"""
+    return _fuzzy_weight
+
+
+def use_fuzzy_weight(weight):
+    """Set the score given to keywords found through typo correction; 0 disables the fuzzy pass"""
+    global _fuzzy_weight
+    _fuzzy_weight = float(weight)
+    return _fuzzy_weight
+
+
+def score_food_terms(texts, words):
     """
-    Analyze food input using keyword matching to identify ingredients, preparations, and cuisines
-    Returns a dictionary of identified food categories and their confidence scores
+    Score food categories from analyzer output: keywords found in any of texts score 1.0 per listing,
+    every keyword related to a word longer than 3 characters scores 0.5, and keywords that only appear
+    once typos in unmatched words are corrected score the fuzzy weight
     """
-    food_text = food_text.lower()
-    words = re.findall(r'\b\w+\b', food_text)
+    profiler = _profiler
+    if profiler is not None:
+        start = time.perf_counter()
 
     # Initialize result with categories and scores
     result = defaultdict(float)
+    # Every index comes from the same knowledge base even if a new one is swapped in meanwhile
+    knowledge_base = get_knowledge_base()
+
+    # Check for exact matches first. Every whole word is also a substring of the text, so a
+    # keyword found by the matcher always earns the full exact-match score of 1.0
+    matcher = knowledge_base.keyword_matcher
+    found = matcher.find_all(*texts)
+    exact_hits = matcher.category_counts(found)
+    for category, hits in exact_hits:
+        result[category] += 1.0 * hits
 
-    # Check for exact matches first
-    for category, keywords in FOOD_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in food_text:
-                result[category] += 1.0
-            elif keyword in words:
-                result[category] += 0.9
+    if profiler is not None:
+        exact_done = time.perf_counter()
+        profiler.record("analyze.exact", exact_done - start)
+        profiler.count("dishes_analyzed")
+        profiler.count("keyword_hits", sum(hits for _, hits in exact_hits))
 
     # Check for partial matches
+    partial_index = knowledge_base.partial_match_index
+    unmatched = []
     for word in words:
         if len(word) > 3:  # Only consider words longer than 3 characters for partial matching
-            for category, keywords in FOOD_KEYWORDS.items():
-                for keyword in keywords:
-                    # Check if the word is a substring of the keyword or vice versa
-                    if word in keyword or keyword in word:
-                        result[category] += 0.5
+            # Each keyword that contains the word or is contained in it adds 0.5 to its categories
+            partial_hits = partial_index.category_hits(word)
+            for category, hits in partial_hits:
+                result[category] += 0.5 * hits
+            if not partial_hits:
+                unmatched.append(word)
+            if profiler is not None:
+                profiler.count("partial_words")
+                profiler.count("keyword_hits", sum(hits for _, hits in partial_hits))
+
+    if profiler is not None:
+        partial_done = time.perf_counter()
+        profiler.record("analyze.partial", partial_done - exact_done)
+
+    # Typo-tolerant pass: words unrelated to any keyword are corrected against the keyword vocabulary in
+    # place and the text matched again. Only keywords overlapping a corrected word are credited, so
+    # "goat cheeese" finds "goat cheese" but "goat, cheese" gains nothing
+    fuzzy_weight = _fuzzy_weight
+    if fuzzy_weight and unmatched:
+        fuzzy_index = knowledge_base.fuzzy_match_index
+        corrections = {}
+        for word in unmatched:
+            correction = fuzzy_index.correct(word)
+            if correction is not None:
+                corrections[word] = correction
+        if corrections:
+            corrected = set()
+            for text in texts:
+                corrected.update(matcher.find_overlapping(*correct_words(text, corrections)))
+            fuzzy_hits = matcher.category_counts(corrected - found)
+            for category, hits in fuzzy_hits:
+                result[category] += fuzzy_weight * hits
+            if profiler is not None:
+                profiler.count("fuzzy_corrections", len(corrections))
+        if profiler is not None:
+            profiler.record("analyze.fuzzy", time.perf_counter() - partial_done)
 
     return result
 
 
-def determine_wine_pairings(food_categories, food_text):
+def correct_words(text, corrections):
+    """
+    Return text with the words in corrections replaced, and the (start, end) spans of the replacements
+    Everything between the words, punctuation included, is kept as it was
+    """
+    pieces = []
+    spans = []
+    position = length = 0
+    for match in re.finditer(r'\w+', text):
+        correction = corrections.get(match.group())
+        if correction is None:
+            continue
+        pieces.append(text[position:match.start()])
+        length += match.start() - position
+        spans.append((length, length + len(correction)))
+        pieces.append(correction)
+        length += len(correction)
+        position = match.end()
+    pieces.append(text[position:])
+    return "".join(pieces), spans
+
+
+def analyze_food_input(food_text):
+    """
+    Analyze food input using keyword matching to identify ingredients, preparations, and cuisines
+    Returns a dictionary of identified food categories and their confidence scores
+    """
+    if _profiler is None:
+        return score_food_terms(*get_analyzer().terms(food_text))
+    start = time.perf_counter()
+    terms = get_analyzer().terms(food_text)
+    _profiler.record("analyze.tokenize", time.perf_counter() - start)
+    return score_food_terms(*terms)
+
+
+def analyze_many(food_texts):
+    """Analyze a batch of dishes, letting the analyzer backend process them together"""
+    start = time.perf_counter()
+    batch_terms = get_analyzer().terms_many(food_texts)
+    if _profiler is not None:
+        _profiler.record("analyze.tokenize", time.perf_counter() - start)
+    return [score_food_terms(texts, words) for texts, words in batch_terms]
+
+
+class WinePairing:
+    """
+    One recommended wine with its score and the rules that picked it
+    Unpacks to (wine, score, explanation) like a plain tuple; the explanation text is only rendered the
+    first time it is read, so results that are never shown never pay for it
+    """
+    __slots__ = ("wine", "score", "rules", "categories", "reasons", "note", "_explanation")
+
+    def __init__(self, wine, score, rules=(), categories=(), reasons=(), note=None):
+        self.wine = wine
+        self.score = score
+        # Combination rules that fired for the wine and categories whose rules list it, in scoring order
+        self.rules = rules
+        self.categories = categories
+        # Ready-made sentences for fallback recommendations, which quote the dish
+        self.reasons = reasons
+        # The wine's characteristics sentence, when the knowledge base describes it
+        self.note = note
+        self._explanation = None
+
+    @property
+    def explanation(self):
+        """The two shortest explanation sentences, joined"""
+        if self._explanation is None:
+            pieces = [f"Perfect for {rule} combinations" for rule in self.rules]
+            pieces.extend(f"Pairs well with {category}" for category in self.categories)
+            pieces.extend(self.reasons)
+            if self.note is not None:
+                pieces.append(self.note)
+            # Get the top 2 most relevant explanations
+            self._explanation = " ".join(sorted(pieces, key=len)[:2])
+        return self._explanation
+
+    def __iter__(self):
+        return iter((self.wine, self.score, self.explanation))
+
+    def __repr__(self):
+        return (f"WinePairing({self.wine!r}, {self.score!r}, rules={list(self.rules)!r}, "
+                f"categories={list(self.categories)!r})")
+
+
+def determine_wine_pairings(food_categories, food_text, top_k=5):
     """
     Determine wine pairings based on food categories
-    Returns a list of tuples (wine_name, score, explanation)
+    Returns the top_k matches (every scored wine when top_k is None) as WinePairing results, which unpack
+    to (wine_name, score, explanation)
     """
+    profiler = _profiler
+    if profiler is not None:
+        start = time.perf_counter()
+
     scores = defaultdict(float)
-    explanations = defaultdict(list)
+    matched_rules = defaultdict(list)
+    matched_categories = defaultdict(list)
+    reasons = defaultdict(list)
 
     # Get categories sorted by confidence score
     sorted_categories = sorted(food_categories.items(), key=lambda x: x[1], reverse=True)
 
-    # Check for specific combinations first
-    for rule, wines in WINE_PAIRING_RULES.items():
-        if "+" in rule:
-            rule_categories = [part.strip() for part in rule.split("+")]
+    # Rules and default wines come from the same knowledge base even if a new one is swapped in meanwhile
+    knowledge_base = get_knowledge_base()
+    rule_index = knowledge_base.pairing_rule_index
+
+    # Check for specific combinations first, looking only at rules reachable from the detected categories
+    combo_rules = rule_index.combo_rules_for(food_categories)
+    for rule, rule_categories, wines in combo_rules:
+        # Check if all parts of the rule are in the food categories
+        if all(cat in food_categories for cat in rule_categories):
+            match_score = sum(food_categories[cat] for cat in rule_categories)
+            for wine in wines:
+                scores[wine] += match_score
+                matched_rules[wine].append(rule)
+            if profiler is not None:
+                profiler.count("rules_matched")
 
-            # Check if all parts of the rule are in the food categories
-            matches = [cat for cat in rule_categories if cat in food_categories]
-            if len(matches) == len(rule_categories):
-                match_score = sum(food_categories[cat] for cat in matches)
-                for wine in wines:
-                    scores[wine] += match_score
-                    explanations[wine].append(f"Perfect for {rule} combinations")
+    if profiler is not None:
+        combo_done = time.perf_counter()
+        profiler.record("pairings.combo", combo_done - start)
+        profiler.count("rules_evaluated", len(combo_rules))
 
     # Process individual categories
     for category, score in sorted_categories:
-        rule_key = category  # Exact match first
-        if rule_key in WINE_PAIRING_RULES:
-            for wine in WINE_PAIRING_RULES[rule_key]:
-                scores[wine] += score
-                explanations[wine].append(f"Pairs well with {category}")
+        for wine in rule_index.single_rules.get(category, ()):
+            scores[wine] += score
+            matched_categories[wine].append(category)
+        if profiler is not None:
+            profiler.count("rules_evaluated")
+            if category in rule_index.single_rules:
+                profiler.count("rules_matched")
+
+    if profiler is not None:
+        single_done = time.perf_counter()
+        profiler.record("pairings.single", single_done - combo_done)
 
     # If no matches were found, provide default recommendations
     if not scores:
+        if profiler is not None:
+            profiler.count("fallback_hits")
         # Check if the food contains any sweet/dessert-related words
         sweet_terms = ["sweet", "dessert", "cake", "pie", "jam", "jelly", "candy", "sugar", "honey",
                        "chocolate", "ice cream", "pudding", "fruit", "berry", "syrup", "caramel"]
@@ -349,67 +475,835 @@ def determine_wine_pairings(food_categories, food_text):
             # For sweet items, recommend dessert wines
             for wine in ["Dessert Wine", "Riesling", "Gewürztraminer"]:
                 scores[wine] += 1.0
-                explanations[wine].append(f"A good match for sweet foods like {food_text}")
+                reasons[wine].append(f"A good match for sweet foods like {food_text}")
         else:
             # For unknown/neutral items, recommend versatile wines
-            for wine in DEFAULT_WINES["versatile"]:
+            default_wines = knowledge_base.default_wines
+            for wine in default_wines["versatile"]:
                 scores[wine] += 1.0
-                explanations[wine].append(f"A versatile wine that pairs with many foods including {food_text}")
+                reasons[wine].append(f"A versatile wine that pairs with many foods including {food_text}")
 
             # Add one red and one white for diversity
-            if "Pinot Noir" not in DEFAULT_WINES["versatile"]:
+            if "Pinot Noir" not in default_wines["versatile"]:
                 scores["Pinot Noir"] += 0.8
-                explanations["Pinot Noir"].append(f"A versatile red that pairs with many foods")
+                reasons["Pinot Noir"].append(f"A versatile red that pairs with many foods")
 
-            if "Chardonnay" not in DEFAULT_WINES["versatile"]:
+            if "Chardonnay" not in default_wines["versatile"]:
                 scores["Chardonnay"] += 0.8
-                explanations["Chardonnay"].append(f"A versatile white that pairs with many foods")
-
-    # Add general characteristics
-    for wine, score in scores.items():
-        if wine in WINE_CHARACTERISTICS:
-            char = WINE_CHARACTERISTICS[wine]
-            body = char["body"]
-            flavors = ", ".join(char["flavors"][:2])
-            characteristics = ", ".join(char["characteristics"])
-            explanations[wine].append(f"A {body}-bodied {characteristics} wine with {flavors} notes")
-
-    # Sort and return top matches with explanations
-    result = []
-    for wine, score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
-        if score > 0:
-            # Get the top 2 most relevant explanations
-            top_explanations = sorted(explanations[wine], key=len)[:2]
-            explanation = " ".join(top_explanations)
-            result.append((wine, score, explanation))
+                reasons["Chardonnay"].append(f"A versatile white that pairs with many foods")
 
-    return result[:5]  # Return top 5 matches
+        if profiler is not None:
+            fallback_done = time.perf_counter()
+            profiler.record("pairings.fallback", fallback_done - single_done)
+            single_done = fallback_done
 
+    # Select the top matches with a heap; nsmallest is stable, so tied wines stay in the order they were
+    # first scored, as with a full sort
+    candidates = [(wine, quantize_score(score)) for wine, score in scores.items() if score > 0]
+    top_matches = heapq.nsmallest(len(candidates) if top_k is None else top_k, candidates, key=lambda x: -x[1])
+    wine_notes = rule_index.wine_notes
+    result = [WinePairing(wine, score, matched_rules.get(wine, ()), matched_categories.get(wine, ()),
+                          reasons.get(wine, ()), wine_notes.get(wine))
+              for wine, score in top_matches]
 
-def print_wine_recommendations(food_text, wine_pairings):
-    """Print wine recommendations in a formatted way"""
-    print(f"\n=== Wine Recommendations for {food_text} ===\n")
+    if profiler is not None:
+        profiler.record("pairings.rank", time.perf_counter() - single_done)
+    return result
+
+
+class VectorizedScorer:
+    """
+    NumPy scoring engine that pairs many dishes in one pass
+    Dish category scores form a dish x category matrix, single rules a category x wine weight matrix and
+    combination rules a category x rule incidence matrix masked per dish. Rankings, ties included,
+    match determine_wine_pairings.
+    """
+
+    def __init__(self, rule_index, categories):
+        import numpy as np
+        self.np = np
+        self.rule_index = rule_index
+
+        # Column order for the dish x category matrix
+        self.categories = list(categories)
+        for category in list(rule_index.single_rules) + list(rule_index.combos_by_category):
+            if category not in self.categories:
+                self.categories.append(category)
+        self.category_ids = {category: index for index, category in enumerate(self.categories)}
+
+        self.wines = []
+        for wines in [wines for _, _, wines in rule_index.combo_rules] + list(rule_index.single_rules.values()):
+            for wine in wines:
+                if wine not in self.wines:
+                    self.wines.append(wine)
+        wine_ids = {wine: index for index, wine in enumerate(self.wines)}
+
+        num_categories = len(self.categories)
+        num_rules = len(rule_index.combo_rules)
+        num_wines = len(self.wines)
+
+        # Position of each wine within a rule's list, used to replay the order wines were first scored in
+        self.list_span = 1 + max([len(wines) for wines in rule_index.single_rules.values()] +
+                                 [len(wines) for _, _, wines in rule_index.combo_rules] + [0])
+        self.single_weights = np.zeros((num_categories, num_wines))
+        self.single_positions = np.zeros((num_categories, num_wines), dtype=np.int64)
+        for category, wines in rule_index.single_rules.items():
+            for position, wine in reversed(list(enumerate(wines))):
+                self.single_weights[self.category_ids[category], wine_ids[wine]] += 1.0
+                self.single_positions[self.category_ids[category], wine_ids[wine]] = position
+
+        # How often each category appears in a rule (for its score) and whether it must be present at all
+        self.combo_incidence = np.zeros((num_categories, num_rules))
+        self.combo_required = np.zeros((num_categories, num_rules))
+        self.combo_weights = np.zeros((num_rules, num_wines))
+        combo_positions = np.zeros((num_rules, num_wines), dtype=np.int64)
+        for rule_id, (rule, rule_categories, wines) in enumerate(rule_index.combo_rules):
+            for category in rule_categories:
+                self.combo_incidence[self.category_ids[category], rule_id] += 1.0
+                self.combo_required[self.category_ids[category], rule_id] = 1.0
+            for position, wine in reversed(list(enumerate(wines))):
+                self.combo_weights[rule_id, wine_ids[wine]] += 1.0
+                combo_positions[rule_id, wine_ids[wine]] = position
+        self.combo_required_counts = self.combo_required.sum(axis=0)
+
+        self.single_mask = self.single_weights > 0
+
+        # Rule wine lists by id, for collecting the matched rules of only the selected wines
+        self.combo_names = [rule for rule, _, _ in rule_index.combo_rules]
+        self.combo_wine_ids = [[wine_ids[wine] for wine in wines] for _, _, wines in rule_index.combo_rules]
+        self.single_wine_ids = [[wine_ids[wine] for wine in rule_index.single_rules.get(category, ())]
+                                for category in self.categories]
+
+        # Sort key of the first time each combination rule scores each wine; combination rules run
+        # before single rules, so their keys sit below any single-rule key
+        self.unreached = (num_rules + num_categories + 1) * self.list_span
+        self.combo_touch = np.where(self.combo_weights > 0,
+                                    np.arange(num_rules)[:, None] * self.list_span + combo_positions,
+                                    self.unreached)
+
+    def score_matrix(self, category_dicts):
+        """
+        Build the dish x category score matrix, plus each category's insertion order within its dish
+        (the tie-break determine_wine_pairings inherits from dict ordering)
+        """
+        np = self.np
+        scores = np.zeros((len(category_dicts), len(self.categories)))
+        order = np.full(scores.shape, len(self.categories))
+        rows, cols, values, positions = [], [], [], []
+        for row, food_categories in enumerate(category_dicts):
+            for position, (category, score) in enumerate(food_categories.items()):
+                col = self.category_ids.get(category)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(score)
+                    positions.append(position)
+        scores[rows, cols] = values
+        order[rows, cols] = positions
+        return scores, order
+
+    def _totals(self, scores):
+        """Return (categories present, combination rules fired, dish x wine totals) for a score matrix"""
+        np = self.np
+        present = scores > 0
+        # A combination rule fires when all of its categories are present; it contributes their summed score
+        active = (present @ self.combo_required) == self.combo_required_counts
+        combo_scores = np.where(active, scores @ self.combo_incidence, 0.0)
+        totals = scores @ self.single_weights + combo_scores @ self.combo_weights
+        # Rounded exactly like quantize_score, so totals summed in matrix order tie where determine_wine_pairings
+        # ties
+        return present, active, np.rint(totals * SCORE_SCALE) / SCORE_SCALE
 
+    def wine_totals(self, category_dicts):
+        """Return the dish x wine matrix of rule-based pairing scores (columns follow self.wines)"""
+        return self._totals(self.score_matrix(category_dicts)[0])[2]
+
+    def pair_many(self, category_dicts, food_texts, top_k=5):
+        """Return determine_wine_pairings results for every dish, scoring them all in one matrix product"""
+        np = self.np
+        if not category_dicts:
+            return []
+
+        scores, order = self.score_matrix(category_dicts)
+        present, active, totals = self._totals(scores)
+        num_rules = len(self.rule_index.combo_rules)
+
+        # Ties are broken by when a wine was first scored: combination rules in table order come first,
+        # then single rules walked in descending category score (stable on insertion order), each rule
+        # scoring its wines in list order
+        category_rank = np.empty_like(order)
+        sort_order = np.lexsort((order, -scores), axis=1)
+        np.put_along_axis(category_rank, sort_order, np.arange(scores.shape[1])[None, :], axis=1)
+        combo_touch = np.where(active[:, :, None], self.combo_touch[None, :, :], self.unreached).min(axis=1)
+        single_keys = (num_rules + category_rank[:, :, None]) * self.list_span + self.single_positions[None, :, :]
+        single_touch = np.where(present[:, :, None] & self.single_mask[None, :, :],
+                                single_keys, self.unreached).min(axis=1)
+        first_touch = np.minimum(combo_touch, single_touch)
+
+        # Top-k by score with argpartition; widen the window so every wine tied with the k-th score is kept
+        k = min(top_k, totals.shape[1])
+        kth_scores = -np.partition(-totals, k - 1, axis=1)[:, k - 1]
+        width = max(k, int((totals >= kth_scores[:, None]).sum(axis=1).max()))
+        candidates = np.argpartition(-totals, width - 1, axis=1)[:, :width]
+        candidate_scores = np.take_along_axis(totals, candidates, axis=1)
+        candidate_touch = np.take_along_axis(first_touch, candidates, axis=1)
+        ranked = np.lexsort((candidate_touch, -candidate_scores), axis=1)[:, :k]
+        top_wines = np.take_along_axis(candidates, ranked, axis=1)
+
+        # Only the selected wines are rendered; group each dish's fired rules and present categories
+        # (in walk order) from a single nonzero pass instead of per-row scans
+        num_dishes = len(food_texts)
+        active_rules = [[] for _ in range(num_dishes)]
+        for row, rule_id in zip(*(axis.tolist() for axis in np.nonzero(active))):
+            active_rules[row].append(rule_id)
+        walked_categories = [[] for _ in range(num_dishes)]
+        present_in_walk = np.take_along_axis(present, sort_order, axis=1)
+        rows, positions = np.nonzero(present_in_walk)
+        for row, col in zip(rows.tolist(), sort_order[rows, positions].tolist()):
+            walked_categories[row].append(col)
+
+        matched = totals.any(axis=1).tolist()
+        top_wines = top_wines.tolist()
+        top_scores = np.take_along_axis(totals, np.array(top_wines), axis=1).tolist()
+
+        results = []
+        for row, food_text in enumerate(food_texts):
+            if not matched[row]:
+                # Nothing matched; the text-based fallback lives in determine_wine_pairings
+                results.append(determine_wine_pairings(category_dicts[row], food_text))
+                continue
+            results.append(self._render_row(top_wines[row], top_scores[row], active_rules[row],
+                                            walked_categories[row]))
+        return results
+
+    def _render_row(self, wine_ids, scores, active_rules, walked_categories):
+        """Build WinePairing results for the selected wines of one dish"""
+        matched = {wine_id: ([], []) for wine_id, score in zip(wine_ids, scores) if score > 0}
+        for rule_id in active_rules:
+            for wine_id in self.combo_wine_ids[rule_id]:
+                if wine_id in matched:
+                    matched[wine_id][0].append(self.combo_names[rule_id])
+        for col in walked_categories:
+            for wine_id in self.single_wine_ids[col]:
+                if wine_id in matched:
+                    matched[wine_id][1].append(self.categories[col])
+
+        wine_notes = self.rule_index.wine_notes
+        result = []
+        for wine_id, score in zip(wine_ids, scores):
+            if score <= 0:
+                continue
+            wine = self.wines[wine_id]
+            rules, categories = matched[wine_id]
+            result.append(WinePairing(wine, score, rules, categories, note=wine_notes.get(wine)))
+        return result
+
+
+def knowledge_base_fingerprint():
+    """Return a content hash of the wine, keyword and rule tables the pairing results depend on"""
+    return get_knowledge_base().fingerprint
+
+
+def results_fingerprint(knowledge_base=None):
+    """
+    Identify everything cached results depend on: the knowledge base contents (of the one in use unless
+    another is given), the analyzer backend and the fuzzy match weight
+    """
+    fingerprint = (knowledge_base or get_knowledge_base()).fingerprint
+    return f"{fingerprint}:{get_analyzer().name}:{_fuzzy_weight:g}"
+
+
+def normalize_food_text(food_text):
+    """
+    Normalize dish text into a cache key: lowercased, with surrounding whitespace stripped
+    Inner whitespace is kept as typed; "goat  cheese" does not contain the keyword "goat cheese", so collapsing
+    it would change the scores
+    """
+    return food_text.lower().strip()
+
+
+class PairingCache:
+    """
+    Two-tier cache of pairing results keyed by normalized dish text
+    A bounded in-memory LRU sits in front of an optional sqlite file that survives restarts. Entries are
+    tagged with results_fingerprint() (tables, analyzer and fuzzy weight), so rows written under other settings
+    are never served. When a new knowledge base is swapped in or the analyzer or fuzzy weight changes, the
+    in-memory tier is dropped and the cache moves to the new fingerprint. It can be shared between threads.
+    """
+
+    # Layout of the stored results; bumping it discards rows written in an older layout
+    ROW_FORMAT = 2
+
+    def __init__(self, max_entries=10000, path=None, fingerprint=None):
+        self.max_entries = max_entries
+        self.settings = results_fingerprint(active_knowledge_base())
+        self.fingerprint = f"{fingerprint or self.settings}:v{self.ROW_FORMAT}"
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version_changes = 0
+        # Guards both tiers; the service reads and fills the cache from its executor threads
+        self._lock = threading.RLock()
+
+        self._db = None
+        self._pending_writes = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS pairings "
+                             "(fingerprint TEXT, food TEXT, result TEXT, PRIMARY KEY (fingerprint, food))")
+            # Results computed from other versions of the tables are stale
+            self._db.execute("DELETE FROM pairings WHERE fingerprint != ?", (self.fingerprint,))
+            self._db.commit()
+
+    def _follow_version(self):
+        """Move to the current results fingerprint if the knowledge base, analyzer or fuzzy weight changed"""
+        settings = results_fingerprint(active_knowledge_base())
+        if settings != self.settings:
+            self.settings = settings
+            self.fingerprint = f"{settings}:v{self.ROW_FORMAT}"
+            self._entries.clear()
+            self.version_changes += 1
+
+    def get(self, key):
+        """Return (food_categories, wine_pairings) for key, or None on a miss"""
+        with self._lock:
+            self._follow_version()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            if self._db is not None:
+                row = self._db.execute("SELECT result FROM pairings WHERE fingerprint = ? AND food = ?",
+                                       (self.fingerprint, key)).fetchone()
+                if row is not None:
+                    stored = json.loads(row[0])
+                    wine_pairings = stored["pairings"]
+                    if wine_pairings is not None:
+                        wine_notes = get_pairing_rule_index().wine_notes
+                        wine_pairings = [WinePairing(wine, score, rules, categories, note=wine_notes.get(wine))
+                                         for wine, score, rules, categories in wine_pairings]
+                    entry = (dict(stored["categories"]), wine_pairings)
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, key, food_categories, wine_pairings, knowledge_base=None):
+        """
+        Store a result; wine_pairings may be None for fallbacks that are rebuilt from the dish text
+        Given the knowledge base the result was computed on, drops it if another one has been swapped in since
+        """
+        with self._lock:
+            self._follow_version()
+            if knowledge_base is not None and results_fingerprint(knowledge_base) != self.settings:
+                return
+            entry = (dict(food_categories), wine_pairings)
+            self._remember(key, entry)
+
+            if self._db is not None:
+                # Pairings are stored structured and their explanations rebuilt when read back
+                if wine_pairings is not None:
+                    wine_pairings = [[pairing.wine, pairing.score, list(pairing.rules), list(pairing.categories)]
+                                     for pairing in wine_pairings]
+                stored = {"categories": list(entry[0].items()), "pairings": wine_pairings}
+                self._db.execute("INSERT OR REPLACE INTO pairings VALUES (?, ?, ?)",
+                                 (self.fingerprint, key, json.dumps(stored, ensure_ascii=False)))
+                self._pending_writes += 1
+                if self._pending_writes >= 256:
+                    self.flush()
+
+    def _remember(self, key, entry):
+        """Add an entry to the in-memory tier, evicting the least recently used past max_entries"""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def flush(self):
+        """Commit pending writes to the on-disk tier"""
+        with self._lock:
+            if self._db is not None and self._pending_writes:
+                self._db.commit()
+                self._pending_writes = 0
+
+    def close(self):
+        """Flush and close the on-disk tier"""
+        with self._lock:
+            if self._db is not None:
+                self.flush()
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        """Return the cache counters as a dict"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "version_changes": self.version_changes,
+                "entries": len(self._entries),
+            }
+
+
+_pairing_cache = None
+
+
+def get_pairing_cache():
+    """Return the shared result cache, creating an in-memory one on first use"""
+    global _pairing_cache
+    if _pairing_cache is None:
+        _pairing_cache = PairingCache()
+    return _pairing_cache
+
+
+def configure_pairing_cache(max_entries=10000, path=None):
+    """Replace the shared result cache, e.g. to resize it or back it with an sqlite file"""
+    global _pairing_cache
+    if _pairing_cache is not None:
+        _pairing_cache.close()
+    _pairing_cache = PairingCache(max_entries=max_entries, path=path)
+    return _pairing_cache
+
+
+_reloader = None
+
+
+def get_reloader():
+    """Return the active knowledge base reloader, or None when the knowledge base is not reloadable"""
+    return _reloader
+
+
+def use_reloader(reloader):
+    """Register a reloader (see knowledge_base.KnowledgeBaseReloader) so its stats show up in the metrics"""
+    global _reloader
+    _reloader = reloader
+    return reloader
+
+
+def metrics_snapshot():
+    """
+    Return the active knowledge base version, the cache counters, and the pipeline profile and reload stats
+    when those are on, as a JSON-ready dict
+    """
+    knowledge_base = active_knowledge_base()
+    metrics = {"knowledge_base": {"version": knowledge_base.version, "source": knowledge_base.source},
+               "cache": get_pairing_cache().stats()}
+    if _reloader is not None:
+        metrics["reload"] = _reloader.stats()
+    if _profiler is not None:
+        metrics["profile"] = _profiler.snapshot()
+    return metrics
+
+
+def prometheus_metrics(prefix="wine_pairing"):
+    """Render metrics_snapshot() in the Prometheus text exposition format"""
+    metrics = metrics_snapshot()
+    lines = []
+
+    def family(name, kind, description, samples):
+        lines.append(f"# HELP {prefix}_{name} {description}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{prefix}_{name}{labels} {value}")
+
+    source = metrics["knowledge_base"]["source"] or "built-in"
+    family("knowledge_base_info", "gauge", "Version of the knowledge base in use",
+           [(f'{{version="{metrics["knowledge_base"]["version"]}",source="{source}"}}', 1)])
+    reload = metrics.get("reload")
+    if reload is not None:
+        family("knowledge_base_reloads_total", "counter", "New knowledge base versions swapped in",
+               [("", reload["reloads"])])
+        family("knowledge_base_reload_failures_total", "counter", "Reloads that failed and kept the old version",
+               [("", reload["failures"])])
+        last = reload["last_reload"]
+        if last is not None:
+            family("knowledge_base_rebuild_seconds", "gauge", "Time the last reload took to rebuild the indexes",
+                   [("", f"{last['rebuild_ms'] / 1000:.6f}")])
+            if last.get("peak_memory_kb") is not None:
+                family("knowledge_base_rebuild_peak_bytes", "gauge",
+                       "Peak memory of the last rebuild: traced allocations, or growth of the process's peak RSS",
+                       [("", round(last["peak_memory_kb"] * 1024))])
+
+    profile = metrics.get("profile")
+    if profile is not None:
+        stages = profile["stages"].items()
+        family("stage_seconds_total", "counter", "Time spent in each pipeline stage",
+               [(f'{{stage="{stage}"}}', f"{values['seconds']:.9f}") for stage, values in stages])
+        family("stage_calls_total", "counter", "Timed calls of each pipeline stage",
+               [(f'{{stage="{stage}"}}', values["calls"]) for stage, values in stages])
+        for counter, amount in profile["counters"].items():
+            family(f"{counter}_total", "counter", f"Pipeline counter {counter}", [("", amount)])
+    for name, value in metrics["cache"].items():
+        if name == "entries":
+            family("cache_entries", "gauge", "Results held in the in-memory cache", [("", value)])
+        else:
+            family(f"cache_{name}_total", "counter", f"Result cache {name.replace('_', ' ')}", [("", value)])
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, metrics_format="prometheus"):
+    """Dump the current metrics to path ('-' for stdout) as Prometheus text or JSON"""
+    if metrics_format == "json":
+        text = json.dumps(metrics_snapshot(), indent=2) + "\n"
+    else:
+        text = prometheus_metrics()
+    if path == "-":
+        sys.stdout.write(text)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def print_profile(profiler, stream=sys.stderr):
+    """Print the profile table, headed by overall throughput when a batch was timed"""
+    print("\n=== Profile ===", file=stream)
+    if "batch" in profiler.stage_calls:
+        dishes, seconds = profiler.counters.get("batch_dishes", 0), profiler.stage_seconds["batch"]
+        print(f"Batch: {dishes} dishes in {seconds:.3f}s ({dishes / seconds:.1f} dishes/s)", file=stream)
+    print(profiler.report(), file=stream)
+
+
+def recommend(food_text, cache=None):
+    """
+    Analyze a dish and pair wines with it, going through the result cache
+    Returns (food_categories, wine_pairings)
+    """
+    if cache is None:
+        cache = get_pairing_cache()
+    key = normalize_food_text(food_text)
+    entry = cache.get(key)
+    if entry is None:
+        # Analysis and pairing run on one knowledge base even if a new one is swapped in between them
+        with pinned_knowledge_base():
+            food_categories = analyze_food_input(key)
+            wine_pairings = determine_wine_pairings(food_categories, food_text)
+            _store_result(cache, key, food_categories, wine_pairings)
+        return food_categories, wine_pairings
+    return _resolve_entry(entry, food_text)
+
+
+def _store_result(cache, key, food_categories, wine_pairings):
+    """
+    Cache a freshly computed result; fallback pairings quote the dish as typed, so only categories are kept
+    Results computed on a knowledge base that has since been swapped out are not cached
+    """
+    knowledge_base = get_knowledge_base()
+    if not knowledge_base.pairing_rule_index.matches(food_categories):
+        wine_pairings = None
+    cache.put(key, food_categories, wine_pairings, knowledge_base=knowledge_base)
+
+
+def _resolve_entry(entry, food_text):
+    """Turn a cache entry back into (food_categories, wine_pairings), rebuilding fallback pairings"""
+    food_categories, wine_pairings = entry
+    if wine_pairings is None:
+        wine_pairings = determine_wine_pairings(food_categories, food_text)
+    return food_categories, wine_pairings
+
+
+def recommendation_details(wine_pairings):
+    """Return what print_wine_recommendations shows for each wine, as a list of dicts"""
+    wine_characteristics = get_knowledge_base().wine_characteristics
+    details = []
     for i, (wine, score, explanation) in enumerate(wine_pairings, 1):
         # Calculate confidence level (1-5 stars based on score)
-        confidence = int(min(5, max(1, score)))
-        stars = "★" * confidence
-
-        print(f"{i}. {wine} {stars}")
+        detail = {"rank": i, "wine": wine, "score": score, "confidence": int(min(5, max(1, score)))}
 
         # Get wine characteristics
-        if wine in WINE_CHARACTERISTICS:
-            char = WINE_CHARACTERISTICS[wine]
-            body = char["body"]
-            characteristics = ", ".join(char["characteristics"])
-            print(f"   {body}-bodied, {characteristics}")
+        if wine in wine_characteristics:
+            char = wine_characteristics[wine]
+            detail["body"] = char["body"]
+            detail["characteristics"] = list(char["characteristics"])
+
+        detail["explanation"] = explanation
+        details.append(detail)
+    return details
+
+
+def print_wine_recommendations(food_text, wine_pairings):
+    """Print wine recommendations in a formatted way"""
+    if _profiler is not None:
+        start = time.perf_counter()
+    print(f"\n=== Wine Recommendations for {food_text} ===\n")
+
+    for detail in recommendation_details(wine_pairings):
+        stars = "★" * detail["confidence"]
+        print(f"{detail['rank']}. {detail['wine']} {stars}")
+
+        if "body" in detail:
+            characteristics = ", ".join(detail["characteristics"])
+            print(f"   {detail['body']}-bodied, {characteristics}")
 
         # Print explanation
-        wrapped_text = textwrap.fill(explanation, width=70, initial_indent="   ", subsequent_indent="   ")
+        wrapped_text = textwrap.fill(detail["explanation"], width=70, initial_indent="   ", subsequent_indent="   ")
         print(f"{wrapped_text}\n")
 
+    if _profiler is not None:
+        _profiler.record("render", time.perf_counter() - start)
+
+
+def warm_up(knowledge_base_source=None, analyzer_name=None, fuzzy_weight=None):
+    """
+    Build the shared matcher and rule indexes, and load the analyzer, ahead of the first request
+    Pool workers that start without the parent's configuration select it from the arguments
+    """
+    if knowledge_base_source and get_knowledge_base().source != knowledge_base_source:
+        from knowledge_base import load_knowledge_base
+        use_knowledge_base(load_knowledge_base(knowledge_base_source))
+    if analyzer_name and get_analyzer().name != analyzer_name:
+        use_analyzer(analyzer_name)
+    if fuzzy_weight is not None:
+        use_fuzzy_weight(fuzzy_weight)
+    get_knowledge_base().compile()
+    get_analyzer().terms("warm up")
+
+
+def worker_setup():
+    """Arguments for warm_up that recreate this process's configuration in a pool worker"""
+    return get_knowledge_base().source, get_analyzer().name, _fuzzy_weight
+
+
+def pairing_record(food_text, food_categories, wine_pairings, explain=True):
+    """
+    Package one dish's analysis and pairings as a JSON-ready dict
+    With explain=False pairings carry only wine and score, and no explanation text is rendered
+    """
+    if explain:
+        pairings = [{"wine": wine, "score": score, "explanation": explanation}
+                    for wine, score, explanation in wine_pairings]
+    else:
+        pairings = [{"wine": pairing.wine, "score": pairing.score} for pairing in wine_pairings]
+    return {
+        "food": food_text,
+        "categories": {category: score for category, score in
+                       sorted(food_categories.items(), key=lambda x: x[1], reverse=True) if score > 0},
+        "pairings": pairings,
+    }
+
+
+def pair_food(food_text):
+    """Run the full pairing pipeline for one dish and return the result as a JSON-ready dict"""
+    food_categories, wine_pairings = recommend(food_text)
+    return pairing_record(food_text, food_categories, wine_pairings)
+
+
+def pair_chunk(dishes, engine="numpy"):
+    """
+    Analyze and pair a chunk of dishes without going through the cache
+    Returns (food_categories, wine_pairings) per dish; safe to run inside pool workers. The whole chunk is
+    scored on one knowledge base even if a new one is swapped in meanwhile
+    """
+    with pinned_knowledge_base():
+        category_dicts = analyze_many([normalize_food_text(food_text) for food_text in dishes])
+        if engine == "python":
+            wine_pairings = [determine_wine_pairings(food_categories, food_text)
+                             for food_categories, food_text in zip(category_dicts, dishes)]
+        elif _profiler is None:
+            wine_pairings = get_vectorized_scorer().pair_many(category_dicts, dishes)
+        else:
+            # Unmatched dishes go through determine_wine_pairings inside pair_many, which times them under its
+            # own stages; that time is left out here so no stage is counted twice
+            profiler = _profiler
+            start, nested = time.perf_counter(), profiler.seconds(profiler.RULE_STAGES)
+            wine_pairings = get_vectorized_scorer().pair_many(category_dicts, dishes)
+            nested = profiler.seconds(profiler.RULE_STAGES) - nested
+            profiler.record("pairings.vectorized", time.perf_counter() - start - nested)
+    return list(zip(category_dicts, wine_pairings))
+
+
+def pair_chunk_profiled(dishes, engine="numpy"):
+    """pair_chunk for pool workers, also returning a profile of the chunk for the parent to merge"""
+    profiler = use_profiler(PipelineProfiler())
+    return pair_chunk(dishes, engine), profiler.snapshot()
+
+
+def dishes_for_wine(wine, dishes, limit=None, category_dicts=None):
+    """
+    Rank dishes by how well a wine pairs with them, scoring the whole list in one vectorized pass
+    Returns dicts with the dish, the wine's score and its rank among all wines for that dish (1 is the top
+    pick), best first; dishes no rule pairs the wine with are left out. Pass category_dicts from an earlier
+    analyze_many to rank the same dishes for several wines without analyzing them again.
+    """
+    wine = get_wine_food_index().resolve(wine)
+    if category_dicts is None:
+        category_dicts = analyze_many([normalize_food_text(food_text) for food_text in dishes])
+    if default_engine() == "numpy":
+        scorer = get_vectorized_scorer()
+        totals = scorer.wine_totals(category_dicts)
+        column = totals[:, scorer.wines.index(wine)]
+        # Rank among wines: one more than the number of wines scoring strictly higher
+        ranks = ((totals > column[:, None]).sum(axis=1) + 1).tolist()
+        wine_scores = column.tolist()
+    else:
+        wine_scores, ranks = [], []
+        for food_text, food_categories in zip(dishes, category_dicts):
+            if not get_pairing_rule_index().matches(food_categories):
+                # Fallback wines are not rule-based affinity
+                wine_scores.append(0.0)
+                ranks.append(0)
+                continue
+            scores = {pairing.wine: pairing.score
+                      for pairing in determine_wine_pairings(food_categories, food_text, top_k=None)}
+            wine_scores.append(scores.get(wine, 0.0))
+            ranks.append(1 + sum(1 for score in scores.values() if score > scores.get(wine, 0.0)))
+
+    ranked = sorted((index for index, score in enumerate(wine_scores) if score > 0),
+                    key=lambda index: (-wine_scores[index], ranks[index], index))
+    if limit is not None:
+        ranked = ranked[:limit]
+    return [{"food": dishes[index], "score": wine_scores[index], "rank": ranks[index]} for index in ranked]
+
+
+def lookup_cached(chunk, cache):
+    """Split a chunk into cache keys, cache entries (None on a miss) and the dishes still to compute"""
+    keys = [normalize_food_text(food_text) for food_text in chunk]
+    entries = [cache.get(key) for key in keys]
+    misses = [food_text for food_text, entry in zip(chunk, entries) if entry is None]
+    return keys, entries, misses
 
-def interactive_mode():
+
+def merge_cached(chunk, keys, entries, computed, cache, explain=True):
+    """Merge cached and freshly computed results back into input order, caching the new ones"""
+    computed = iter(computed)
+    for food_text, key, entry in zip(chunk, keys, entries):
+        if entry is None:
+            food_categories, wine_pairings = next(computed)
+            _store_result(cache, key, food_categories, wine_pairings)
+        else:
+            food_categories, wine_pairings = _resolve_entry(entry, food_text)
+        yield pairing_record(food_text, food_categories, wine_pairings, explain)
+
+
+def prepare_knowledge_base(knowledge_base):
+    """Build what pairing needs beyond a knowledge base's compiled sections, e.g. before a reload goes live"""
+    if default_engine() == "numpy":
+        get_vectorized_scorer(knowledge_base)
+    return knowledge_base
+
+
+def default_engine():
+    """Return the batch scoring engine to use: numpy when it is installed, plain Python otherwise"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return "python"
+    return "numpy"
+
+
+def _chunked(iterable, size):
+    """Yield successive lists of up to size items without reading ahead of the current chunk"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_dishes(stream):
+    """Yield one dish per non-blank line of a text stream"""
+    for line in stream:
+        food_text = line.strip()
+        if food_text:
+            yield food_text
+
+
+def pair_dishes(dishes, workers=1, chunk_size=256, engine=None, cache=None, explain=True):
+    """
+    Pair a stream of dishes, yielding result dicts in input order
+    Dishes found in the result cache are answered directly. The rest of each chunk is scored in one pass by
+    the numpy engine unless engine="python". With workers > 1 chunks are spread over a process pool, keeping
+    at most two chunks per worker in flight so memory stays bounded however long the input is
+    Raises ValueError when chunk_size is below 1
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    engine = engine or default_engine()
+    if cache is None:
+        cache = get_pairing_cache()
+    chunks = _chunked(dishes, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            keys, entries, misses = lookup_cached(chunk, cache)
+            computed = pair_chunk(misses, engine) if misses else []
+            yield from merge_cached(chunk, keys, entries, computed, cache, explain)
+        return
+
+    # Build the indexes before forking so workers inherit them instead of rebuilding
+    warm_up()
+    if engine == "numpy":
+        get_vectorized_scorer()
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up, initargs=worker_setup()) as executor:
+        pending = deque()
+
+        # Workers keep their own profiles; with profiling on each chunk brings its profile back to merge
+        profiler = _profiler
+        task = pair_chunk if profiler is None else pair_chunk_profiled
+
+        def finish_oldest():
+            chunk, keys, entries, future = pending.popleft()
+            computed = future.result() if future is not None else []
+            if profiler is not None and future is not None:
+                computed, snapshot = computed
+                profiler.merge(snapshot)
+            return merge_cached(chunk, keys, entries, computed, cache, explain)
+
+        for chunk in chunks:
+            keys, entries, misses = lookup_cached(chunk, cache)
+            future = executor.submit(task, misses, engine) if misses else None
+            pending.append((chunk, keys, entries, future))
+            if len(pending) >= workers * 2:
+                yield from finish_oldest()
+        while pending:
+            yield from finish_oldest()
+
+
+def batch_mode(input_path, output_path="-", workers=1, chunk_size=256, engine=None, explain=True,
+               find_bottles=None):
+    """
+    Pair every dish in input_path ('-' for stdin) and write the results as JSON Lines
+    find_bottles, when given, maps (wine, score) pairs to in-stock bottles listed under "bottles"
+    """
+    input_file = sys.stdin if input_path == "-" else open(input_path, encoding="utf-8")
+    output_file = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        dishes = read_dishes(input_file)
+        for record in pair_dishes(dishes, workers=workers, chunk_size=chunk_size, engine=engine, explain=explain):
+            if find_bottles is not None:
+                wine_scores = [(pairing["wine"], pairing["score"]) for pairing in record["pairings"]]
+                record["bottles"] = [bottle.to_dict() for bottle in find_bottles(wine_scores)]
+            output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if _profiler is not None:
+                _profiler.count("batch_dishes")
+        output_file.flush()
+        if _profiler is not None:
+            _profiler.record("batch", time.perf_counter() - start)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+def show_bottles(find_bottles, wine_pairings):
+    """Print the in-stock bottles find_bottles picks for the recommended wines"""
+    from inventory import print_bottles
+    print_bottles(find_bottles([(pairing.wine, pairing.score) for pairing in wine_pairings]))
+
+
+def interactive_mode(find_bottles=None):
     """Run the CLI in interactive mode."""
     print("=== Wine and Food Pairing Assistant ===")
     print("Enter a food dish to get wine pairing recommendations.")
@@ -424,9 +1318,10 @@ def interactive_mode():
             if not food_text:
                 continue
 
-            food_categories = analyze_food_input(food_text)
-            wine_pairings = determine_wine_pairings(food_categories, food_text)
+            food_categories, wine_pairings = recommend(food_text)
             print_wine_recommendations(food_text, wine_pairings)
+            if find_bottles is not None:
+                show_bottles(find_bottles, wine_pairings)
             print("-" * 70)
 
         except KeyboardInterrupt:
@@ -438,29 +1333,142 @@ def interactive_mode():
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Wine and Food Pairing CLI")
+    if sys.argv[1:2] == ["serve"]:
+        from server import main_serve
+        main_serve(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["compile"]:
+        from knowledge_base import main_compile
+        sys.exit(main_compile(sys.argv[2:]))
+    if sys.argv[1:2] == ["menu"]:
+        from menu import main_menu
+        sys.exit(main_menu(sys.argv[2:]))
+    if sys.argv[1:2] == ["wine"]:
+        from wine_lookup import main_wine
+        sys.exit(main_wine(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Wine and Food Pairing CLI",
+                                     epilog="Run 'main.py serve --help' for the long-running HTTP service, "
+                                            "'main.py compile --help' to build knowledge base snapshots, "
+                                            "'main.py menu --help' to pair a whole menu and "
+                                            "'main.py wine --help' to find foods for a wine.")
     parser.add_argument("food", nargs="?", help="Food dish to get wine pairing recommendations for")
     parser.add_argument("-a", "--analyze", action="store_true", help="Show detailed analysis of the food input")
+    parser.add_argument("-b", "--batch", metavar="FILE",
+                        help="Pair every dish in FILE (one per line, '-' for stdin) and write JSON Lines")
+    parser.add_argument("-o", "--output", metavar="FILE", default="-",
+                        help="Where to write batch results (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of worker processes for batch mode (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="Dishes handed to a worker at a time in batch mode (default: 256)")
+    parser.add_argument("--engine", choices=["numpy", "python"],
+                        help="Batch scoring engine (default: numpy when installed)")
+    parser.add_argument("--no-explain", action="store_true",
+                        help="Write only wines and scores in batch mode, skipping explanation text")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="Results kept in the in-memory cache, 0 to disable (default: 10000)")
+    parser.add_argument("--cache-file", metavar="PATH",
+                        help="sqlite file that keeps cached results across runs")
+    parser.add_argument("--cache-stats", action="store_true", help="Print cache hit/miss counters to stderr")
+    parser.add_argument("--kb", metavar="PATH",
+                        help="Knowledge base to use: a compiled snapshot (trusted files only, it is unpickled) "
+                             "or a JSON, TOML or sqlite source")
+    parser.add_argument("--watch", action="store_true",
+                        help="In interactive mode, reload the --kb file whenever it changes")
+    parser.add_argument("--trace-reload-memory", action="store_true",
+                        help="With --watch, measure each reload's peak memory exactly "
+                             "(traces all allocations meanwhile)")
+    parser.add_argument("--analyzer", choices=sorted(ANALYZERS), default="regex",
+                        help="Food text analyzer; spacy adds lemmatization (default: regex)")
+    parser.add_argument("--fuzzy-weight", type=float, default=FUZZY_MATCH_WEIGHT,
+                        help=f"Score of keywords matched despite a typo, 0 to disable (default: {FUZZY_MATCH_WEIGHT})")
+    parser.add_argument("--live", action="store_true",
+                        help="Interactive mode that updates detected categories and wines as you type")
+    parser.add_argument("--inventory", metavar="PATH",
+                        help="Bottle catalog (CSV or sqlite) to pick in-stock bottles of the recommended wines from")
+    parser.add_argument("--min-price", type=float, help="Cheapest bottle to suggest from the inventory")
+    parser.add_argument("--max-price", type=float, help="Most expensive bottle to suggest from the inventory")
+    parser.add_argument("--bottles", type=int, default=5, help="In-stock bottles to suggest (default: 5)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each pipeline stage and print a profile summary to stderr")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="Profile the run and write the metrics to FILE ('-' for stdout) when done")
+    parser.add_argument("--metrics-format", choices=["prometheus", "json"], default="prometheus",
+                        help="Format of the --metrics dump (default: prometheus)")
 
     args = parser.parse_args()
 
-    if args.food:
-        food_categories = analyze_food_input(args.food)
+    if args.watch and not args.kb:
+        parser.error("--watch needs --kb")
+    if args.bottles < 0:
+        parser.error("--bottles cannot be negative")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.kb:
+        from knowledge_base import KnowledgeBaseReloader, load_knowledge_base
+        try:
+            use_knowledge_base(load_knowledge_base(args.kb))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if args.watch and not (args.batch or args.food):
+            use_reloader(KnowledgeBaseReloader(args.kb, trace_memory=args.trace_reload_memory,
+                                               prepare=prepare_knowledge_base)).start()
+    try:
+        use_analyzer(args.analyzer).terms("")
+    except (ImportError, OSError) as e:
+        parser.error(str(e))
+    use_fuzzy_weight(args.fuzzy_weight)
+    find_bottles = None
+    if args.inventory:
+        from inventory import load_inventory
+        try:
+            inventory = load_inventory(args.inventory)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        find_bottles = partial(inventory.top_bottles, k=args.bottles, min_price=args.min_price,
+                               max_price=args.max_price)
+    cache = configure_pairing_cache(max_entries=args.cache_size, path=args.cache_file)
+    profiler = use_profiler(PipelineProfiler()) if args.profile or args.metrics else None
+    try:
+        if args.batch:
+            batch_mode(args.batch, args.output, workers=args.workers, chunk_size=args.chunk_size,
+                       engine=args.engine, explain=not args.no_explain, find_bottles=find_bottles)
+        elif args.food:
+            food_categories, wine_pairings = recommend(args.food)
 
-        if args.analyze:
-            print("\n=== Food Analysis ===")
-            print(f"Input: {args.food}")
-            print("\nCategories detected:")
-            for category, score in sorted(food_categories.items(), key=lambda x: x[1], reverse=True):
-                if score > 0:
-                    print(f"- {category}: {score:.1f}")
-            print("")
+            if args.analyze:
+                print("\n=== Food Analysis ===")
+                print(f"Input: {args.food}")
+                print("\nCategories detected:")
+                for category, score in sorted(food_categories.items(), key=lambda x: x[1], reverse=True):
+                    if score > 0:
+                        print(f"- {category}: {score:.1f}")
+                print("")
 
-        wine_pairings = determine_wine_pairings(food_categories, args.food)
-        print_wine_recommendations(args.food, wine_pairings)
-    else:
-        interactive_mode()
+            print_wine_recommendations(args.food, wine_pairings)
+            if find_bottles is not None:
+                show_bottles(find_bottles, wine_pairings)
+        elif args.live:
+            from typeahead import live_mode
+            try:
+                live_mode(find_bottles)
+            except OSError as e:
+                parser.error(str(e))
+        else:
+            interactive_mode(find_bottles)
+    finally:
+        cache.close()
+        if args.cache_stats:
+            print(json.dumps({"cache": cache.stats()}), file=sys.stderr)
+        if args.profile:
+            print_profile(profiler)
+        if args.metrics:
+            write_metrics(args.metrics, args.metrics_format)
 
 
 if __name__ == "__main__":
+    # Subcommand and live-mode modules import this file as "main"; registering the running script under that
+    # name lets them share its settings instead of loading a second copy
+    sys.modules.setdefault("main", sys.modules[__name__])
     main()
@@ -0,0 +1,308 @@
+"""
+Whole-menu pairing: a small set of bottles that pairs well with every course
+
+Every course is scored against every wine by the regular pairing engine. Choosing at most `budget` wines so
+that the sum over courses of the best chosen wine's score is as high as possible is a maximum-coverage
+(facility location) problem, optionally with a minimum number of reds and whites. The objective is
+submodular, so:
+
+- a greedy pass, polished by swapping wines in and out, gives a solution within (1 - 1/e) of the optimum
+  and usually much closer;
+- the optimality gap is bounded by the greedy "online" bound (the solution plus the best `budget`
+  marginal gains against it) or the sum of each course's best wine, whichever is tighter;
+- when NumPy is installed and the search is small enough (the full varietal list, a budget of a few
+  bottles and hundreds of courses), every feasible set is scored in vectorized chunks and the optimum is
+  proven.
+
+Run it with `python main.py menu COURSES` (one course per line).
+"""
+import argparse
+import heapq
+import json
+import math
+import sys
+import time
+from itertools import combinations, islice
+
+import main
+
+# Colors of the built-in wines; knowledge base entries can set their own with a "color" field
+WINE_COLORS = {
+    "Cabernet Sauvignon": "red",
+    "Merlot": "red",
+    "Pinot Noir": "red",
+    "Syrah/Shiraz": "red",
+    "Zinfandel": "red",
+    "Malbec": "red",
+    "Sangiovese": "red",
+    "Nebbiolo": "red",
+    "Barbera": "red",
+    "Chardonnay": "white",
+    "Sauvignon Blanc": "white",
+    "Riesling": "white",
+    "Pinot Grigio": "white",
+    "Gewürztraminer": "white",
+    "Vermentino": "white",
+    "Rosé": "rosé",
+    "Sparkling Wine": "sparkling",
+    "Dessert Wine": "dessert",
+}
+
+# Largest exhaustive search, in course x wine set x bottle cells, before settling for the greedy solution
+# and its bound (about a quarter of a second with NumPy)
+EXACT_SEARCH_CELLS = 50000000
+
+
+def wine_color(wine):
+    """Return a wine's color: its knowledge base "color" field, the built-in table, or "other\""""
+    char = main.get_knowledge_base().wine_characteristics.get(wine, {})
+    return char.get("color") or WINE_COLORS.get(wine, "other")
+
+
+def score_courses(courses):
+    """
+    Score every wine for every course with the pairing engine
+    Returns (wines, scores) where scores[i] maps wine index to score for course i, with only nonzero entries
+    """
+    wines = list(main.get_knowledge_base().wine_characteristics)
+    wine_ids = {wine: index for index, wine in enumerate(wines)}
+    scores = []
+    category_dicts = main.analyze_many([main.normalize_food_text(course) for course in courses])
+    for course, food_categories in zip(courses, category_dicts):
+        course_scores = {}
+        for pairing in main.determine_wine_pairings(food_categories, course, top_k=None):
+            if pairing.wine not in wine_ids:
+                wine_ids[pairing.wine] = len(wines)
+                wines.append(pairing.wine)
+            course_scores[wine_ids[pairing.wine]] = pairing.score
+        scores.append(course_scores)
+    return wines, scores
+
+
+class MenuProblem:
+    """Courses x wines score table in the sparse per-wine form the solvers work on"""
+
+    def __init__(self, wines, scores, budget, min_red=0, min_white=0):
+        self.wines = wines
+        self.scores = scores
+        self.budget = min(budget, len(wines))
+        self.min_red = min_red
+        self.min_white = min_white
+        self.colors = [wine_color(wine) for wine in wines]
+        if min_red + min_white > self.budget:
+            raise ValueError(f"A budget of {self.budget} bottles cannot include {min_red} red and "
+                             f"{min_white} white wines")
+        for color, needed in (("red", min_red), ("white", min_white)):
+            if self.colors.count(color) < needed:
+                raise ValueError(f"Only {self.colors.count(color)} {color} wines are available, "
+                                 f"{needed} requested")
+        # For each wine, the (course, score) pairs it scores on
+        self.columns = [[] for _ in wines]
+        for course, course_scores in enumerate(scores):
+            for wine, score in course_scores.items():
+                self.columns[wine].append((course, score))
+
+    def value(self, selection):
+        """Total score when every course gets its best wine from selection"""
+        return sum(max((course_scores.get(wine, 0.0) for wine in selection), default=0.0)
+                   for course_scores in self.scores)
+
+    def coverage(self, selection):
+        """Each course's best score under selection"""
+        return [max((course_scores.get(wine, 0.0) for wine in selection), default=0.0)
+                for course_scores in self.scores]
+
+    def gain(self, wine, best):
+        """How much adding wine raises the total, given each course's current best score"""
+        return sum(score - best[course] for course, score in self.columns[wine] if score > best[course])
+
+    def feasible_to_complete(self, selection, wine):
+        """Whether selection plus wine can still meet the color minimums within the budget"""
+        chosen = selection + [wine]
+        missing = (max(0, self.min_red - sum(1 for w in chosen if self.colors[w] == "red")) +
+                   max(0, self.min_white - sum(1 for w in chosen if self.colors[w] == "white")))
+        return missing <= self.budget - len(chosen)
+
+    def satisfies_colors(self, selection):
+        """Whether selection meets the color minimums"""
+        return (sum(1 for wine in selection if self.colors[wine] == "red") >= self.min_red and
+                sum(1 for wine in selection if self.colors[wine] == "white") >= self.min_white)
+
+    def upper_bound(self, selection):
+        """
+        Bound on the best achievable total: the sum of every course's best score overall, or the selection's
+        value plus its `budget` largest marginal gains (valid because the objective is submodular)
+        """
+        everything = sum(max(course_scores.values(), default=0.0) for course_scores in self.scores)
+        best = self.coverage(selection)
+        gains = heapq.nlargest(self.budget, (self.gain(wine, best) for wine in range(len(self.wines))))
+        return min(everything, sum(best) + sum(gains))
+
+
+def solve_greedy(problem):
+    """Greedy selection by marginal gain under the color minimums, then 1-swap local search"""
+    selection = []
+    best = [0.0] * len(problem.scores)
+    while len(selection) < problem.budget:
+        candidates = [wine for wine in range(len(problem.wines))
+                      if wine not in selection and problem.feasible_to_complete(selection, wine)]
+        if not candidates:
+            break
+        # max() keeps the first of equal gains, so ties go to the wine listed first
+        wine = max(candidates, key=lambda candidate: problem.gain(candidate, best))
+        selection.append(wine)
+        for course, score in problem.columns[wine]:
+            if score > best[course]:
+                best[course] = score
+
+    # Swap a chosen wine for an unchosen one while that improves the total
+    value = problem.value(selection)
+    improved = True
+    while improved:
+        improved = False
+        for position in range(len(selection)):
+            for wine in range(len(problem.wines)):
+                if wine in selection:
+                    continue
+                trial = selection[:position] + [wine] + selection[position + 1:]
+                if not problem.satisfies_colors(trial):
+                    continue
+                trial_value = problem.value(trial)
+                if trial_value > value + 1e-9:
+                    selection, value, improved = trial, trial_value, True
+    return selection, value
+
+
+def solve_exact(problem, np, chunk_cells=2000000):
+    """Score every feasible wine set of the budget's size with NumPy and return the best"""
+    matrix = np.zeros((len(problem.scores), len(problem.wines)))
+    for course, course_scores in enumerate(problem.scores):
+        for wine, score in course_scores.items():
+            matrix[course, wine] = score
+    red = np.array([color == "red" for color in problem.colors])
+    white = np.array([color == "white" for color in problem.colors])
+
+    best_selection, best_value = None, -1.0
+    sets = combinations(range(len(problem.wines)), problem.budget)
+    # Sets are scored a chunk at a time so the courses x sets x budget block stays around chunk_cells
+    chunk_size = max(1, chunk_cells // (len(problem.scores) * problem.budget))
+    while True:
+        chunk = np.array(list(islice(sets, chunk_size)), dtype=np.int64)
+        if not len(chunk):
+            break
+        feasible = (red[chunk].sum(axis=1) >= problem.min_red) & (white[chunk].sum(axis=1) >= problem.min_white)
+        chunk = chunk[feasible]
+        if len(chunk):
+            # courses x sets x budget -> each course's best wine per set -> total per set
+            totals = matrix[:, chunk].max(axis=2).sum(axis=0)
+            index = int(totals.argmax())
+            if totals[index] > best_value + 1e-9:
+                best_selection, best_value = [int(wine) for wine in chunk[index]], float(totals[index])
+    return best_selection, best_value
+
+
+def optimize_menu(courses, budget=3, min_red=0, min_white=0, exact=True):
+    """
+    Pick at most budget wines for a list of courses, maximizing the summed pairing score
+    Returns a JSON-ready dict with the wines, each course's assigned wine, the total and its optimality gap
+    """
+    start = time.perf_counter()
+    wines, scores = score_courses(courses)
+    scored = time.perf_counter()
+
+    problem = MenuProblem(wines, scores, budget, min_red, min_white)
+    selection, value = solve_greedy(problem)
+    bound = problem.upper_bound(selection)
+    method = "greedy"
+
+    search_cells = math.comb(len(wines), problem.budget) * len(courses) * problem.budget
+    if exact and value < bound - 1e-9 and search_cells <= EXACT_SEARCH_CELLS:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            exact_selection, exact_value = solve_exact(problem, np)
+            if exact_selection is not None and exact_value > value + 1e-9:
+                selection, value = exact_selection, exact_value
+            bound = value
+            method = "exhaustive"
+    solved = time.perf_counter()
+
+    # Present wines in the order they were picked, each course with its best selected wine
+    assignments = []
+    for course, course_scores in zip(courses, scores):
+        wine = max(selection, key=lambda candidate: course_scores.get(candidate, 0.0))
+        score = course_scores.get(wine, 0.0)
+        assignments.append({"course": course, "wine": wines[wine] if score > 0 else None, "score": score})
+    return {
+        "wines": [{"wine": wines[wine], "color": problem.colors[wine],
+                   "courses": sum(1 for assignment in assignments if assignment["wine"] == wines[wine])}
+                  for wine in selection],
+        "courses": assignments,
+        "total_score": round(value, 6),
+        "upper_bound": round(bound, 6),
+        "gap": round((bound - value) / bound, 6) if bound > 0 else 0.0,
+        "method": method,
+        "score_ms": round((scored - start) * 1000, 3),
+        "solve_ms": round((solved - scored) * 1000, 3),
+    }
+
+
+def print_menu_plan(plan):
+    """Print a menu plan in the style of print_wine_recommendations"""
+    print(f"\n=== Menu Pairing: {len(plan['wines'])} wines for {len(plan['courses'])} courses ===\n")
+    for i, wine in enumerate(plan["wines"], 1):
+        print(f"{i}. {wine['wine']} ({wine['color']}), pours with {wine['courses']} course(s)")
+    print("")
+    for assignment in plan["courses"]:
+        wine = assignment["wine"] or "no good match"
+        print(f"- {assignment['course']}: {wine} ({assignment['score']:.1f})")
+    print(f"\nTotal score {plan['total_score']:.2f}, within {plan['gap']:.1%} of optimal ({plan['method']}; "
+          f"scored in {plan['score_ms']:.1f} ms, solved in {plan['solve_ms']:.1f} ms)\n")
+
+
+def main_menu(argv=None):
+    """Entry point for `python main.py menu`"""
+    parser = argparse.ArgumentParser(prog="main.py menu",
+                                     description="Pick a small set of wines that covers every course of a menu")
+    parser.add_argument("courses", help="File with one course per line, '-' for stdin")
+    parser.add_argument("--budget", type=int, default=3, help="Most wines to open (default: 3)")
+    parser.add_argument("--min-red", type=int, default=0, help="Least red wines among them (default: 0)")
+    parser.add_argument("--min-white", type=int, default=0, help="Least white wines among them (default: 0)")
+    parser.add_argument("--greedy", action="store_true", help="Skip the exhaustive search even when it is small")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON")
+    parser.add_argument("--kb", metavar="PATH",
+                        help="Knowledge base to use: a compiled snapshot (trusted files only, it is unpickled) "
+                             "or a JSON, TOML or sqlite source")
+    args = parser.parse_args(argv)
+
+    if args.kb:
+        from knowledge_base import load_knowledge_base
+        try:
+            main.use_knowledge_base(load_knowledge_base(args.kb))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    if args.budget < 1:
+        parser.error("--budget must be at least 1")
+    try:
+        stream = sys.stdin if args.courses == "-" else open(args.courses, encoding="utf-8")
+    except OSError as e:
+        parser.error(str(e))
+    try:
+        courses = list(main.read_dishes(stream))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    if not courses:
+        parser.error("No courses given")
+
+    try:
+        plan = optimize_menu(courses, args.budget, args.min_red, args.min_white, exact=not args.greedy)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(plan, ensure_ascii=False, indent=2))
+    else:
+        print_menu_plan(plan)
+    return 0
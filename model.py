@@ -0,0 +1,854 @@
+"""
+The knowledge base model: the built-in wine, keyword and rule tables, the indexes compiled from them and
+the version of them in use
+
+Pairing code (main.py), the loaders and snapshot compiler (knowledge_base.py) and the helper modules all
+build on this module, and it imports none of them, so it can be loaded on its own, e.g. to unpickle a
+compiled snapshot.
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Knowledge base files that are read as sqlite databases
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Wine characteristics database
+WINE_CHARACTERISTICS = {
+    "Cabernet Sauvignon": {
+        "body": "full",
+        "tannins": "high",
+        "acidity": "medium-high",
+        "flavors": ["black currant", "black cherry", "cedar", "graphite"],
+        "pairings": ["rich meats", "steak", "lamb", "strong cheeses"],
+        "characteristics": ["robust", "structured", "powerful"]
+    },
+    "Merlot": {
+        "body": "medium-full",
+        "tannins": "medium",
+        "acidity": "medium",
+        "flavors": ["plum", "black cherry", "chocolate", "herbs"],
+        "pairings": ["pizza", "pasta", "grilled meats", "burgers"],
+        "characteristics": ["smooth", "approachable", "fruit-forward"]
+    },
+    "Pinot Noir": {
+        "body": "light-medium",
+        "tannins": "low-medium",
+        "acidity": "medium-high",
+        "flavors": ["red cherry", "strawberry", "mushroom", "forest floor"],
+        "pairings": ["salmon", "roasted chicken", "duck", "mushroom dishes"],
+        "characteristics": ["elegant", "silky", "subtle"]
+    },
+    "Syrah/Shiraz": {
+        "body": "full",
+        "tannins": "medium-high",
+        "acidity": "medium",
+        "flavors": ["blackberry", "black pepper", "smoke", "licorice"],
+        "pairings": ["barbecue", "grilled meats", "spicy dishes", "stews"],
+        "characteristics": ["bold", "peppery", "dark"]
+    },
+    "Zinfandel": {
+        "body": "medium-full",
+        "tannins": "medium",
+        "acidity": "medium-high",
+        "flavors": ["raspberry", "blackberry", "pepper", "spice"],
+        "pairings": ["pizza", "pasta", "barbecue", "burgers", "spicy foods"],
+        "characteristics": ["jammy", "spicy", "bold"]
+    },
+    "Malbec": {
+        "body": "medium-full",
+        "tannins": "medium",
+        "acidity": "medium",
+        "flavors": ["blackberry", "plum", "chocolate", "tobacco"],
+        "pairings": ["steak", "barbecue", "spicy foods", "mexican cuisine"],
+        "characteristics": ["plush", "velvety", "fruit-forward"]
+    },
+    "Chardonnay": {
+        "body": "medium-full",
+        "tannins": "none",
+        "acidity": "medium",
+        "flavors": ["apple", "pear", "vanilla", "butter"],
+        "pairings": ["creamy pasta", "lobster", "roasted chicken", "creamy sauces"],
+        "characteristics": ["rich", "creamy", "versatile"]
+    },
+    "Sauvignon Blanc": {
+        "body": "light-medium",
+        "tannins": "none",
+        "acidity": "high",
+        "flavors": ["grapefruit", "green apple", "grass", "herbs"],
+        "pairings": ["salads", "fish", "goat cheese", "vegetable dishes"],
+        "characteristics": ["crisp", "herbaceous", "zesty"]
+    },
+    "Riesling": {
+        "body": "light-medium",
+        "tannins": "none",
+        "acidity": "high",
+        "flavors": ["peach", "apricot", "honey", "petrol"],
+        "pairings": ["spicy foods", "asian cuisine", "pork", "sushi"],
+        "characteristics": ["aromatic", "fruity", "varying sweetness"]
+    },
+    "Pinot Grigio": {
+        "body": "light",
+        "tannins": "none",
+        "acidity": "medium-high",
+        "flavors": ["pear", "apple", "lemon", "almond"],
+        "pairings": ["light seafood", "salads", "light pasta", "appetizers"],
+        "characteristics": ["crisp", "light", "refreshing"]
+    },
+    "Sangiovese": {
+        "body": "medium",
+        "tannins": "medium-high",
+        "acidity": "high",
+        "flavors": ["cherry", "plum", "herbs", "tea"],
+        "pairings": ["tomato-based pasta", "pizza", "italian cuisine", "cured meats"],
+        "characteristics": ["savory", "earthy", "rustic"]
+    },
+    "Nebbiolo": {
+        "body": "medium-full",
+        "tannins": "high",
+        "acidity": "high",
+        "flavors": ["cherry", "rose", "tar", "licorice"],
+        "pairings": ["rich pasta", "truffle dishes", "aged cheeses", "risotto"],
+        "characteristics": ["complex", "powerful", "elegant"]
+    },
+    "Barbera": {
+        "body": "medium",
+        "tannins": "low",
+        "acidity": "high",
+        "flavors": ["cherry", "strawberry", "plum", "herbs"],
+        "pairings": ["tomato-based pasta", "pizza", "eggplant", "italian cuisine"],
+        "characteristics": ["juicy", "vibrant", "food-friendly"]
+    },
+    "Gewürztraminer": {
+        "body": "medium",
+        "tannins": "none",
+        "acidity": "low-medium",
+        "flavors": ["lychee", "rose", "ginger", "spice"],
+        "pairings": ["spicy asian cuisine", "thai food", "indian cuisine", "aromatic dishes"],
+        "characteristics": ["aromatic", "floral", "spicy"]
+    },
+    "Dessert Wine": {
+        "body": "full",
+        "tannins": "varies",
+        "acidity": "high",
+        "flavors": ["honey", "caramel", "dried fruit", "nuts"],
+        "pairings": ["desserts", "cheese", "fruit", "chocolate", "nuts"],
+        "characteristics": ["sweet", "complex", "concentrated"]
+    },
+    "Sparkling Wine": {
+        "body": "light",
+        "tannins": "none",
+        "acidity": "high",
+        "flavors": ["apple", "citrus", "toast", "brioche"],
+        "pairings": ["appetizers", "seafood", "fried foods", "celebrations"],
+        "characteristics": ["effervescent", "crisp", "celebratory"]
+    },
+    "Rosé": {
+        "body": "light-medium",
+        "tannins": "low",
+        "acidity": "medium-high",
+        "flavors": ["strawberry", "watermelon", "citrus", "flowers"],
+        "pairings": ["salads", "light pastas", "grilled fish", "vegetable dishes"],
+        "characteristics": ["refreshing", "versatile", "fruity"]
+    }
+}
+
+# Food keywords and related terms - expanded with more terms and associations
+FOOD_KEYWORDS = {
+    # Pasta types and dishes
+    "pasta": ["pasta", "spaghetti", "fettuccine", "linguine", "penne", "rigatoni", "farfalle",
+              "lasagna", "ravioli", "tortellini", "macaroni", "tagliatelle", "orzo", "noodle"],
+    "pizza": ["pizza", "flatbread", "calzone", "stromboli"],
+
+    # Pasta sauces and preparations
+    "tomato": ["tomato", "marinara", "pomodoro", "arrabbiata", "red sauce", "bolognese", "amatriciana"],
+    "cream": ["cream", "alfredo", "carbonara", "bechamel", "white sauce", "beurre blanc", "creamy"],
+    "vodka": ["vodka", "vodka sauce", "pink sauce", "rosé sauce"],
+    "pesto": ["pesto", "basil sauce", "herb sauce", "green sauce"],
+    "oil": ["oil", "olive oil", "aglio e olio", "garlic oil"],
+
+    # Meats
+    "beef": ["beef", "steak", "brisket", "short rib", "ground beef", "meatball", "meatloaf", "hamburger"],
+    "pork": ["pork", "ham", "bacon", "prosciutto", "pancetta", "sausage", "salami", "chorizo", "loin"],
+    "lamb": ["lamb", "mutton", "rack of lamb", "lamb chop", "leg of lamb"],
+    "chicken": ["chicken", "poultry", "turkey", "duck", "cornish hen", "quail", "fowl", "bird"],
+
+    # Seafood
+    "fish": ["fish", "salmon", "tuna", "cod", "trout", "halibut", "tilapia", "sea bass", "swordfish"],
+    "shellfish": ["shellfish", "shrimp", "lobster", "crab", "scallop", "clam", "mussel", "oyster"],
+
+    # Cooking methods
+    "grilled": ["grill", "grilled", "barbecue", "bbq", "charred", "charcoal", "smoky", "flame-cooked"],
+    "roasted": ["roast", "roasted", "baked", "oven", "broiled"],
+    "fried": ["fried", "deep-fried", "pan-fried", "crispy", "tempura"],
+    "braised": ["braise", "braised", "slow-cooked", "stewed"],
+
+    # Flavors and seasonings
+    "spicy": ["spicy", "hot", "chili", "pepper", "cajun", "sriracha", "jalapeno", "paprika", "curry"],
+    "herbs": ["herb", "basil", "oregano", "thyme", "rosemary", "parsley", "mint", "cilantro", "dill"],
+    "garlic": ["garlic", "shallot", "onion", "leek"],
+    "cheese": ["cheese", "parmesan", "mozzarella", "cheddar", "gouda", "ricotta", "goat cheese", "blue cheese"],
+
+    # Cuisines
+    "italian": ["italian", "italy", "mediterranean", "tuscan", "sicilian", "roman"],
+    "french": ["french", "france", "provencal", "bistro"],
+    "asian": ["asian", "chinese", "japanese", "thai", "vietnamese", "korean", "soy sauce", "ginger", "teriyaki"],
+    "mexican": ["mexican", "taco", "burrito", "enchilada", "salsa", "guacamole", "tortilla", "quesadilla"],
+    "indian": ["indian", "curry", "tandoori", "masala", "korma", "tikka", "naan"],
+    "mediterranean": ["mediterranean", "greek", "middle eastern", "lebanese", "moroccan"],
+
+    # Vegetables
+    "mushroom": ["mushroom", "fungi", "portobello", "shiitake", "truffle", "porcini", "cremini"],
+    "vegetable": ["vegetable", "vegetarian", "vegan", "plant-based", "meatless", "greens"],
+
+    # Sweet things
+    "dessert": ["dessert", "cake", "pie", "pastry", "tart", "sweet", "chocolate", "custard", "pudding"],
+    "fruit": ["fruit", "berry", "apple", "pear", "peach", "cherry", "strawberry", "raspberry", "blueberry",
+              "blackberry", "citrus", "lemon", "orange", "grapefruit", "tropical", "mango", "pineapple"],
+    "chocolate": ["chocolate", "cocoa", "fudge", "ganache", "brownie", "truffle"],
+    "caramel": ["caramel", "toffee", "butterscotch", "dulce de leche"],
+    "nuts": ["nut", "almond", "walnut", "pecan", "hazelnut", "pistachio", "peanut"],
+
+    # Misc food types
+    "appetizer": ["appetizer", "starter", "hors d'oeuvre", "tapas", "small plate", "finger food"],
+    "salad": ["salad", "greens", "vinaigrette", "slaw", "cold dish"],
+    "soup": ["soup", "stew", "broth", "bisque", "chowder", "gumbo"],
+    "sandwich": ["sandwich", "burger", "sub", "wrap", "panini", "toast"],
+    "breakfast": ["breakfast", "brunch", "eggs", "pancake", "waffle", "bacon", "sausage", "omelette"]
+}
+
+# Wine pairing rules - expanded with more combinations
+WINE_PAIRING_RULES = {
+    # Pasta combinations
+    "pasta + tomato": ["Sangiovese", "Barbera", "Pinot Noir", "Zinfandel", "Merlot"],
+    "pasta + cream": ["Chardonnay", "Pinot Grigio", "Pinot Noir", "Merlot"],
+    "pasta + vodka": ["Barbera", "Sangiovese", "Pinot Noir", "Sauvignon Blanc", "Zinfandel"],
+    "pasta + pesto": ["Sauvignon Blanc", "Pinot Grigio", "Vermentino"],
+    "pasta + oil": ["Pinot Grigio", "Sauvignon Blanc", "Chardonnay"],
+    "pasta + mushroom": ["Pinot Noir", "Nebbiolo", "Chardonnay"],
+
+    # Pizza
+    "pizza": ["Sangiovese", "Barbera", "Zinfandel", "Merlot"],
+    "pizza + spicy": ["Zinfandel", "Syrah/Shiraz", "Malbec"],
+
+    # Meat dishes
+    "beef": ["Cabernet Sauvignon", "Malbec", "Syrah/Shiraz", "Zinfandel"],
+    "pork": ["Pinot Noir", "Merlot", "Zinfandel", "Riesling"],
+    "lamb": ["Cabernet Sauvignon", "Syrah/Shiraz", "Malbec", "Nebbiolo"],
+    "chicken": ["Chardonnay", "Pinot Noir", "Sauvignon Blanc", "Merlot"],
+
+    # Seafood
+    "fish": ["Pinot Grigio", "Sauvignon Blanc", "Chardonnay", "Pinot Noir"],
+    "shellfish": ["Pinot Grigio", "Sauvignon Blanc", "Chardonnay", "Riesling"],
+
+    # Cooking methods
+    "grilled": ["Zinfandel", "Syrah/Shiraz", "Malbec", "Cabernet Sauvignon"],
+    "roasted": ["Pinot Noir", "Merlot", "Chardonnay", "Cabernet Sauvignon"],
+    "fried": ["Chardonnay", "Pinot Grigio", "Sauvignon Blanc", "Sparkling Wine"],
+    "braised": ["Cabernet Sauvignon", "Syrah/Shiraz", "Nebbiolo", "Malbec"],
+
+    # Flavors and ingredients
+    "spicy": ["Riesling", "Gewürztraminer", "Zinfandel", "Syrah/Shiraz"],
+    "garlic": ["Sauvignon Blanc", "Pinot Grigio", "Chardonnay"],
+    "cheese": ["Cabernet Sauvignon", "Chardonnay", "Merlot", "Pinot Noir"],
+    "mushroom": ["Pinot Noir", "Nebbiolo", "Chardonnay", "Merlot"],
+
+    # Cuisines
+    "italian": ["Sangiovese", "Barbera", "Nebbiolo", "Pinot Grigio"],
+    "french": ["Pinot Noir", "Chardonnay", "Cabernet Sauvignon", "Sauvignon Blanc"],
+    "asian": ["Riesling", "Gewürztraminer", "Sauvignon Blanc", "Pinot Noir"],
+    "mexican": ["Malbec", "Zinfandel", "Sauvignon Blanc", "Riesling"],
+    "indian": ["Riesling", "Gewürztraminer", "Syrah/Shiraz", "Pinot Noir"],
+    "mediterranean": ["Sangiovese", "Pinot Grigio", "Syrah/Shiraz"],
+
+    # Sweet and dessert pairings
+    "dessert": ["Dessert Wine", "Riesling", "Gewürztraminer"],
+    "fruit": ["Riesling", "Gewürztraminer", "Dessert Wine", "Sparkling Wine", "Rosé"],
+    "chocolate": ["Dessert Wine", "Syrah/Shiraz", "Zinfandel", "Cabernet Sauvignon"],
+    "caramel": ["Dessert Wine", "Chardonnay"],
+    "nuts": ["Dessert Wine", "Chardonnay", "Merlot"],
+
+    # Misc food types
+    "appetizer": ["Sparkling Wine", "Sauvignon Blanc", "Pinot Grigio", "Rosé"],
+    "salad": ["Sauvignon Blanc", "Pinot Grigio", "Rosé"],
+    "soup": ["Chardonnay", "Sauvignon Blanc", "Pinot Noir"],
+    "sandwich": ["Zinfandel", "Merlot", "Chardonnay"],
+    "breakfast": ["Sparkling Wine", "Riesling", "Sauvignon Blanc"]
+}
+
+# Default wine pairings for when no specific match is found
+DEFAULT_WINES = {
+    "red": ["Merlot", "Pinot Noir", "Cabernet Sauvignon"],
+    "white": ["Chardonnay", "Sauvignon Blanc", "Pinot Grigio"],
+    "versatile": ["Pinot Noir", "Chardonnay", "Rosé", "Riesling"]
+}
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over every keyword in FOOD_KEYWORDS
+    Finds all keywords (multi-word phrases included) that occur in a text in a single pass
+    """
+
+    def __init__(self, food_keywords):
+        self.categories = list(food_keywords)
+        self.keywords = []
+        # For each keyword, the indexes of the categories listing it (once per listing)
+        self.keyword_categories = []
+        keyword_ids = {}
+        for category_index, keywords in enumerate(food_keywords.values()):
+            for keyword in keywords:
+                if keyword not in keyword_ids:
+                    keyword_ids[keyword] = len(self.keywords)
+                    self.keywords.append(keyword)
+                    self.keyword_categories.append([])
+                self.keyword_categories[keyword_ids[keyword]].append(category_index)
+
+        # Trie of keyword characters; state 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for keyword_id, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state].append(keyword_id)
+
+        # Breadth-first pass to wire failure links and merge outputs along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """Return the set of keyword ids occurring anywhere in text"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def scan(self, text, state=0):
+        """
+        Yield (state, keyword ids ending at the character) for each character of text, starting from state
+        Saving the states lets a text that is edited at its end be rescanned from the first changed character
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            yield state, output[state]
+
+    def overlapping(self, outputs, spans):
+        """
+        Return the set of keyword ids in outputs (keyword ids ending at each character, as scan yields them)
+        whose match overlaps one of the (start, end) character spans
+        """
+        found = set()
+        if not spans:
+            return found
+        keywords = self.keywords
+        for position in range(spans[0][0], len(outputs)):
+            for keyword_id in outputs[position]:
+                start = position - len(keywords[keyword_id]) + 1
+                if any(start < span_end and position >= span_start for span_start, span_end in spans):
+                    found.add(keyword_id)
+        return found
+
+    def find_overlapping(self, text, spans):
+        """Return the set of keyword ids occurring in text whose match overlaps one of the (start, end) spans"""
+        return self.overlapping([output for _, output in self.scan(text)], spans)
+
+    def find_all(self, *texts):
+        """Return the set of keyword ids occurring in any of texts"""
+        return self.find(texts[0]).union(*(self.find(text) for text in texts[1:]))
+
+    def category_hits(self, *texts):
+        """Return per-category counts of the keywords found in any of texts, in FOOD_KEYWORDS order"""
+        return self.category_counts(self.find_all(*texts))
+
+    def category_counts(self, keyword_ids):
+        """Return per-category counts of a set of keyword ids, in FOOD_KEYWORDS order"""
+        counts = defaultdict(int)
+        for keyword_id in keyword_ids:
+            for category_index in self.keyword_categories[keyword_id]:
+                counts[category_index] += 1
+        return [(self.categories[index], counts[index]) for index in sorted(counts)]
+
+
+class PartialMatchIndex:
+    """
+    Substring index over the keyword vocabulary for the partial-match pass
+    Answers which keywords contain a word, and which keywords a word contains, without a vocabulary scan
+    """
+
+    def __init__(self, matcher, min_word_length=4, memo_size=65536):
+        self.matcher = matcher
+        # Every substring a word could equal, mapped to the ids of the keywords containing it.
+        # Words are runs of word characters, so substrings spanning spaces or hyphens are skipped.
+        containing = defaultdict(set)
+        for keyword_id, keyword in enumerate(matcher.keywords):
+            for run in re.findall(r'\w+', keyword):
+                for start in range(len(run) - min_word_length + 1):
+                    for end in range(start + min_word_length, len(run) + 1):
+                        containing[run[start:end]].add(keyword_id)
+        # Frozen into tuples: smaller, and much faster to load from a snapshot than sets
+        self._containing = {substring: tuple(ids) for substring, ids in containing.items()}
+        # Per-word memo so tokens repeated across dishes are only resolved once
+        self.memo_size = memo_size
+        self.category_hits = lru_cache(maxsize=memo_size)(self._category_hits)
+
+    def __getstate__(self):
+        # The memo wraps a bound method and cannot be pickled; it is rebuilt empty on load
+        state = self.__dict__.copy()
+        del state["category_hits"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.category_hits = lru_cache(maxsize=self.memo_size)(self._category_hits)
+
+    def _category_hits(self, word):
+        """Return per-category counts of keywords related to word, in FOOD_KEYWORDS order"""
+        keyword_ids = self.matcher.find(word).union(self._containing.get(word, ()))
+        counts = defaultdict(int)
+        for keyword_id in keyword_ids:
+            for category_index in self.matcher.keyword_categories[keyword_id]:
+                counts[category_index] += 1
+        return tuple((self.matcher.categories[index], counts[index]) for index in sorted(counts))
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance between a and b (insertions, deletions, substitutions and adjacent
+    transpositions), or limit + 1 as soon as it is known to exceed limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_row = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before_previous, previous_row = previous_row, row
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before_previous[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+def deletes(word, distance):
+    """Return every string reachable from word by deleting up to distance characters, word included"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier if len(variant) > 1
+                    for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+class FuzzyMatchIndex:
+    """
+    SymSpell-style deletion index over the words of every keyword, for typo-tolerant lookup
+    Each vocabulary word is filed under every string reachable by deleting up to max_distance characters.
+    A query generates its own deletes and only verifies the few words filed under one of them, so
+    "prosciuto" finds "prosciutto" without comparing it against the whole vocabulary.
+
+    Real words are often one edit from a keyword word ("mustard" and "custard", "fired" and "fried"), so
+    corrections are held back where such collisions are common: words shorter than min_word_length are
+    never corrected, and a correction must keep the word's first letter, which typos rarely change.
+    """
+
+    def __init__(self, matcher, max_distance=2, min_word_length=7, memo_size=65536):
+        self.max_distance = max_distance
+        self.min_word_length = min_word_length
+        # Keyword words in table order; the first of several equally close words wins
+        self.vocabulary = []
+        seen = set()
+        for keyword in matcher.keywords:
+            for word in re.findall(r'\w+', keyword):
+                if len(word) >= min_word_length - 1 and word not in seen:
+                    seen.add(word)
+                    self.vocabulary.append(word)
+        filed = defaultdict(list)
+        for word_id, word in enumerate(self.vocabulary):
+            for variant in deletes(word, max_distance):
+                filed[variant].append(word_id)
+        self._deletes = {variant: tuple(word_ids) for variant, word_ids in filed.items()}
+        self.memo_size = memo_size
+        self.correct = lru_cache(maxsize=memo_size)(self._correct)
+
+    def __getstate__(self):
+        # The memo wraps a bound method and cannot be pickled; it is rebuilt empty on load
+        state = self.__dict__.copy()
+        del state["correct"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.correct = lru_cache(maxsize=self.memo_size)(self._correct)
+
+    def allowed_distance(self, word):
+        """Edits tolerated for a word: one below 9 characters, two from there (up to max_distance)"""
+        if len(word) < self.min_word_length:
+            return 0
+        return min(self.max_distance, 1 if len(word) < 9 else 2)
+
+    def _correct(self, word):
+        """Return the closest vocabulary word within the allowed distance of word, or None"""
+        distance = self.allowed_distance(word)
+        if not distance:
+            return None
+        candidates = set()
+        for variant in deletes(word, distance):
+            candidates.update(self._deletes.get(variant, ()))
+        best, best_distance = None, distance + 1
+        for word_id in sorted(candidates):
+            if self.vocabulary[word_id][0] != word[0]:
+                continue
+            candidate_distance = edit_distance(word, self.vocabulary[word_id], distance)
+            if candidate_distance < best_distance:
+                best, best_distance = self.vocabulary[word_id], candidate_distance
+        return best
+
+
+class KeywordTrie:
+    """
+    Prefix trie over the keyword vocabulary for as-you-type completion
+    Every node keeps its best completions, so a lookup costs one step per typed character. Keywords listed
+    by more categories rank first, then shorter ones.
+    """
+
+    def __init__(self, matcher, completions=8):
+        keywords = matcher.keywords
+        ranked = sorted(range(len(keywords)), key=lambda keyword_id: (-len(matcher.keyword_categories[keyword_id]),
+                                                                      len(keywords[keyword_id]), keywords[keyword_id]))
+        # Longest keyword in words, i.e. how far back a completion can start
+        self.max_words = max((len(keyword.split()) for keyword in keywords), default=1)
+        self._children = [{}]
+        best = [[]]
+        for keyword_id in ranked:
+            node = 0
+            for char in keywords[keyword_id]:
+                next_node = self._children[node].get(char)
+                if next_node is None:
+                    next_node = len(self._children)
+                    self._children.append({})
+                    best.append([])
+                    self._children[node][char] = next_node
+                node = next_node
+                if len(best[node]) < completions:
+                    best[node].append(keywords[keyword_id])
+        self._best = [tuple(node_best) for node_best in best]
+
+    def complete(self, prefix):
+        """Return the best keywords starting with prefix"""
+        node = 0
+        for char in prefix:
+            node = self._children[node].get(char)
+            if node is None:
+                return ()
+        return self._best[node] if node else ()
+
+
+class PairingRuleIndex:
+    """
+    WINE_PAIRING_RULES compiled into an inverted index from food category to the rules it takes part in
+    Rule keys are parsed and wine names validated once, so a pairing only visits reachable rules
+    """
+
+    def __init__(self, pairing_rules, wine_characteristics, strict=False):
+        # Combination rules as (rule, categories, wines), kept in table order
+        self.combo_rules = []
+        # Single-category rules, category -> wines
+        self.single_rules = {}
+        # Category -> indexes into combo_rules of every combination it takes part in
+        self.combos_by_category = defaultdict(list)
+        # Wines named by a rule that have no entry in the characteristics table
+        self.unknown_wines = []
+
+        for rule, wines in pairing_rules.items():
+            wines = tuple(wines)
+            for wine in wines:
+                if wine not in wine_characteristics and wine not in self.unknown_wines:
+                    self.unknown_wines.append(wine)
+
+            if "+" in rule:
+                rule_categories = tuple(part.strip() for part in rule.split("+"))
+                rule_id = len(self.combo_rules)
+                self.combo_rules.append((rule, rule_categories, wines))
+                for category in set(rule_categories):
+                    self.combos_by_category[category].append(rule_id)
+            else:
+                self.single_rules[rule] = wines
+
+        if strict and self.unknown_wines:
+            raise ValueError(f"Pairing rules reference unknown wines: {', '.join(self.unknown_wines)}")
+
+        # Characteristics sentence for each known wine, rendered once
+        self.wine_notes = {}
+        for wine, char in wine_characteristics.items():
+            body = char["body"]
+            flavors = ", ".join(char["flavors"][:2])
+            characteristics = ", ".join(char["characteristics"])
+            self.wine_notes[wine] = f"A {body}-bodied {characteristics} wine with {flavors} notes"
+
+    def combo_rules_for(self, categories):
+        """Return the combination rules involving any of the given categories, in table order"""
+        rule_ids = set()
+        for category in categories:
+            rule_ids.update(self.combos_by_category.get(category, ()))
+        return [self.combo_rules[rule_id] for rule_id in sorted(rule_ids)]
+
+    def matches(self, food_categories):
+        """Return True if any rule fires for the given categories, i.e. no fallback pairing is needed"""
+        if any(category in self.single_rules for category in food_categories):
+            return True
+        return any(all(cat in food_categories for cat in rule_categories)
+                   for _, rule_categories, _ in self.combo_rules_for(food_categories))
+
+
+class WineFoodIndex:
+    """
+    Reverse of the pairing rules: for each wine, the food categories and combinations it is recommended for
+    Categories are ranked by the share of their rule's recommendations the wine takes (a wine named by a
+    two-wine rule is a stronger match than one of five), single-category rules before combinations
+    """
+
+    def __init__(self, rule_index, food_keywords, examples=3):
+        self.examples = {category: list(keywords[:examples]) for category, keywords in food_keywords.items()}
+        # wine -> category -> [single-rule share, combination share, position in the rule's list]
+        affinity = defaultdict(dict)
+        # wine -> combination rules naming it, as (rule, categories) in table order
+        self.combos = defaultdict(list)
+
+        for category, wines in rule_index.single_rules.items():
+            for position, wine in enumerate(wines):
+                entry = affinity[wine].setdefault(category, [0.0, 0.0, position])
+                entry[0] += 1 / len(wines)
+        for rule, rule_categories, wines in rule_index.combo_rules:
+            for position, wine in enumerate(wines):
+                if position == wines.index(wine):
+                    self.combos[wine].append((rule, rule_categories))
+                for category in rule_categories:
+                    entry = affinity[wine].setdefault(category, [0.0, 0.0, position])
+                    entry[1] += 1 / len(wines) / len(rule_categories)
+
+        category_order = {category: index for index, category in enumerate(food_keywords)}
+        # wine -> [(category, single share, combination share)], best first
+        self.categories = {}
+        for wine, categories in affinity.items():
+            ranked = sorted(categories.items(), key=lambda item: (-item[1][0], -item[1][1], item[1][2],
+                                                                 category_order.get(item[0], len(category_order))))
+            self.categories[wine] = [(category, single, combo) for category, (single, combo, _) in ranked]
+        self.wines = list(self.categories)
+        self._names = {}
+        for wine in self.wines:
+            for name in [wine] + wine.split("/"):
+                self._names.setdefault(name.strip().casefold(), wine)
+
+    def resolve(self, name):
+        """Return the wine a name refers to, matched case-insensitively; either half of "Syrah/Shiraz" works too"""
+        wine = self._names.get(name.strip().casefold())
+        if wine is None:
+            raise ValueError(f"No pairing rule recommends {name!r}")
+        return wine
+
+    def foods_for(self, wine, limit=None):
+        """Return what a wine pairs with as a JSON-ready dict: ranked categories and combination rules"""
+        wine = self.resolve(wine)
+        categories = self.categories[wine] if limit is None else self.categories[wine][:limit]
+        return {
+            "wine": wine,
+            "categories": [{"category": category, "single_share": round(single, 4), "combo_share": round(combo, 4),
+                            "examples": self.examples.get(category, [])}
+                           for category, single, combo in categories],
+            "combinations": [{"rule": rule, "categories": list(rule_categories)}
+                             for rule, rule_categories in self.combos.get(wine, ())],
+        }
+
+
+class KnowledgeBase:
+    """
+    The wine, keyword and rule tables together with the indexes compiled from them
+    Indexes are built on first use, or read from a compiled snapshot when the knowledge base was loaded from
+    one, and then shared by every call
+    """
+
+    def __init__(self, wine_characteristics=None, food_keywords=None, wine_pairing_rules=None, default_wines=None,
+                 source=None, snapshot=None):
+        self._tables = None
+        if snapshot is None:
+            self._tables = {
+                "wine_characteristics": wine_characteristics,
+                "food_keywords": food_keywords,
+                "wine_pairing_rules": wine_pairing_rules,
+                "default_wines": default_wines,
+            }
+        self.source = source
+        self._snapshot = snapshot
+        self._sections = {}
+        self._fingerprint = snapshot.fingerprint if snapshot is not None else None
+
+    def section(self, name, build):
+        """
+        Return a compiled section, reading it from the snapshot or building it the first time
+        Pairing code attaches structures derived from the indexes (the NumPy scorer) the same way
+        """
+        value = self._sections.get(name)
+        if value is None:
+            if self._snapshot is not None and name in self._snapshot.sections:
+                value = self._snapshot.read(name)
+            else:
+                value = build()
+            self._sections[name] = value
+        return value
+
+    @property
+    def tables(self):
+        if self._tables is None:
+            self._tables = self.section("tables", dict)
+        return self._tables
+
+    @property
+    def wine_characteristics(self):
+        return self.tables["wine_characteristics"]
+
+    @property
+    def food_keywords(self):
+        return self.tables["food_keywords"]
+
+    @property
+    def wine_pairing_rules(self):
+        return self.tables["wine_pairing_rules"]
+
+    @property
+    def default_wines(self):
+        return self.tables["default_wines"]
+
+    @property
+    def fingerprint(self):
+        """Content hash of the tables, used to tag cached results"""
+        if self._fingerprint is None:
+            tables = [self.wine_characteristics, self.food_keywords, self.wine_pairing_rules, self.default_wines]
+            self._fingerprint = hashlib.sha256(json.dumps(tables, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return self._fingerprint
+
+    @property
+    def version(self):
+        """Short tag for this version of the tables, reported alongside cached results and metrics"""
+        return self.fingerprint[:12]
+
+    def _analyzer(self):
+        """The keyword matcher and partial-match index, compiled (and snapshotted) together"""
+        def build():
+            matcher = KeywordMatcher(self.food_keywords)
+            return matcher, PartialMatchIndex(matcher)
+        return self.section("analyzer", build)
+
+    @property
+    def keyword_matcher(self):
+        return self._analyzer()[0]
+
+    @property
+    def partial_match_index(self):
+        return self._analyzer()[1]
+
+    @property
+    def fuzzy_match_index(self):
+        return self.section("fuzzy", lambda: FuzzyMatchIndex(self.keyword_matcher))
+
+    @property
+    def keyword_trie(self):
+        # Only interactive sessions use it, so it is built on first use rather than snapshotted
+        return self.section("trie", lambda: KeywordTrie(self.keyword_matcher))
+
+    @property
+    def pairing_rule_index(self):
+        return self.section("rules", lambda: PairingRuleIndex(self.wine_pairing_rules, self.wine_characteristics))
+
+    @property
+    def wine_food_index(self):
+        # Built from the rule index rather than snapshotted, like the vectorized scorer
+        return self.section("reverse", lambda: WineFoodIndex(self.pairing_rule_index, self.food_keywords))
+
+    def compile(self):
+        """Build every snapshotted section up front"""
+        self._analyzer()
+        self.fuzzy_match_index
+        self.pairing_rule_index
+        return self
+
+
+_knowledge_base = None
+# Per-thread knowledge base that calls spanning several steps hold on to while a new one is swapped in
+_pinned = threading.local()
+
+
+def get_knowledge_base():
+    """Return the knowledge base pairing calls use: the one pinned on this thread, else the active one"""
+    pinned = getattr(_pinned, "knowledge_base", None)
+    if pinned is not None:
+        return pinned
+    return active_knowledge_base()
+
+
+def active_knowledge_base():
+    """Return the knowledge base currently swapped in, defaulting to the built-in tables"""
+    global _knowledge_base
+    if _knowledge_base is None:
+        _knowledge_base = KnowledgeBase(WINE_CHARACTERISTICS, FOOD_KEYWORDS, WINE_PAIRING_RULES, DEFAULT_WINES)
+    return _knowledge_base
+
+
+def use_knowledge_base(knowledge_base):
+    """
+    Make knowledge_base the one every pairing call uses
+    The swap is a single assignment; calls already running, and threads that pinned the previous one, finish
+    on the version they started with
+    """
+    global _knowledge_base
+    _knowledge_base = knowledge_base
+    return knowledge_base
+
+
+@contextmanager
+def pinned_knowledge_base(knowledge_base=None):
+    """Keep this thread on one knowledge base (by default the one it uses now) until the block exits"""
+    previous = getattr(_pinned, "knowledge_base", None)
+    _pinned.knowledge_base = knowledge_base or get_knowledge_base()
+    try:
+        yield _pinned.knowledge_base
+    finally:
+        _pinned.knowledge_base = previous
@@ -0,0 +1,417 @@
+"""
+Long-running HTTP/JSON service for wine pairings
+
+Keeps the keyword matcher, rule indexes and result cache warm between requests instead of paying
+interpreter startup per lookup. Start it with `python main.py serve` and query it on localhost:
+
+    GET  /pair?food=...          one dish
+    POST /pair   {"food": ...}   one dish
+    POST /batch  {"foods": [...]} many dishes, scored off the event loop in a worker pool;
+                                 add "explain": false for wines and scores only
+    GET  /stats                  knowledge base version and cache counters, plus stage timings when
+                                 started with --profile and reload stats when started with --kb
+    GET  /metrics                the same in the Prometheus text format
+    POST /reload                 reload the --kb file now instead of waiting for --watch to notice
+    GET  /health
+
+Responses carry the "version" of the knowledge base that produced them. With --watch the --kb file is
+reloaded when it changes: the new version is built in the background and swapped in, requests already
+running finish on the old one, and the worker pool is replaced so new batches use the new version.
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import main
+
+
+class HttpError(Exception):
+    """An error that maps directly to an HTTP status code"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class HttpRequest:
+    """A parsed HTTP/1.x request"""
+
+    def __init__(self, method, path, query, headers, body, keep_alive):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+    def json(self):
+        """Decode the request body as a JSON object"""
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HttpError(400, "Request body is not valid JSON")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "Request body must be a JSON object")
+        return payload
+
+
+class PlainText:
+    """A response body to send as text instead of JSON"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def recommendation_response(record):
+    """Turn a pairing record into the structured form of print_wine_recommendations"""
+    wine_pairings = [(pairing["wine"], pairing["score"], pairing["explanation"]) for pairing in record["pairings"]]
+    return {
+        "food": record["food"],
+        "categories": record["categories"],
+        "recommendations": main.recommendation_details(wine_pairings),
+    }
+
+
+class PairingServer:
+    """
+    Minimal asyncio HTTP/1.1 server with keep-alive, a concurrency limit and per-request timeouts
+    The event loop only parses requests and writes responses: single dishes are paired in a thread, and
+    batches are split into cache hits and misses in a thread, with only the misses shipped to the worker pool
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, max_concurrency=64, request_timeout=10.0,
+                 idle_timeout=30.0, workers=1, engine=None, max_body_size=8 * 1024 * 1024, max_batch_size=10000,
+                 watch=False):
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self.idle_timeout = idle_timeout
+        self.workers = workers
+        self.engine = engine or main.default_engine()
+        self.max_body_size = max_body_size
+        self.max_batch_size = max_batch_size
+        self.watch = watch
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pool = None
+        # The knowledge base the pool's workers were started with
+        self._pool_knowledge_base = None
+        self._server = None
+        self._watcher = None
+
+    async def start(self):
+        """Warm the tables, start the worker pool and begin listening"""
+        main.warm_up()
+        if self.engine == "numpy":
+            main.get_vectorized_scorer()
+        if self.workers > 0:
+            self._start_pool()
+        reloader = main.get_reloader()
+        if self.watch and reloader is not None:
+            self._watcher = asyncio.create_task(self._watch(reloader))
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Report the real port when an ephemeral one (port 0) was requested
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """Start the server and run until cancelled"""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def _start_pool(self):
+        """Start a worker pool on the active knowledge base, letting a previous pool finish its batches"""
+        previous = self._pool
+        self._pool_knowledge_base = main.active_knowledge_base()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=main.warm_up,
+                                         initargs=main.worker_setup())
+        if previous is not None:
+            previous.shutdown(wait=False)
+
+    async def _watch(self, reloader):
+        """Check the knowledge base file for changes every reloader.interval seconds"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(reloader.interval)
+            # Rebuilding takes a while; it runs in a thread so requests keep being served meanwhile
+            await loop.run_in_executor(None, reloader.check)
+
+    async def close(self):
+        """Stop listening and shut the worker pool down"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def _handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it or stops using keep-alive"""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.idle_timeout)
+                except HttpError as e:
+                    self._write_response(writer, e.status, {"error": e.message}, keep_alive=False)
+                    await writer.drain()
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                status, payload = await self._dispatch(request)
+                self._write_response(writer, status, payload, request.keep_alive)
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Read one request from the stream, or return None if the client closed the connection"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length")
+        if length > self.max_body_size:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        url = urlsplit(target)
+        return HttpRequest(method.upper(), url.path, parse_qs(url.query), headers, body, keep_alive)
+
+    async def _dispatch(self, request):
+        """
+        Route a request under the concurrency limit and timeout, returning (status, payload)
+        Time spent waiting for a slot counts against the same timeout as handling the request
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_timeout
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.request_timeout)
+        except asyncio.TimeoutError:
+            return 503, {"error": "Server is at its concurrency limit"}
+        try:
+            return 200, await asyncio.wait_for(self._route(request), deadline - loop.time())
+        except HttpError as e:
+            return e.status, {"error": e.message}
+        except asyncio.TimeoutError:
+            return 504, {"error": "Request timed out"}
+        except Exception as e:
+            return 500, {"error": f"An error occurred: {str(e)}"}
+        finally:
+            self._slots.release()
+
+    async def _route(self, request):
+        """Handle a request and return its JSON payload"""
+        if request.path == "/health" and request.method == "GET":
+            return {"status": "ok"}
+        if request.path == "/stats" and request.method == "GET":
+            return main.metrics_snapshot()
+        if request.path == "/metrics" and request.method == "GET":
+            return PlainText(main.prometheus_metrics())
+        if request.path == "/reload":
+            if request.method != "POST":
+                raise HttpError(405, "Use POST")
+            return await self._reload()
+        if request.path == "/pair":
+            if request.method == "GET":
+                food_text = (request.query.get("food") or [""])[0]
+            elif request.method == "POST":
+                food_text = request.json().get("food")
+            else:
+                raise HttpError(405, "Use GET or POST")
+            return await self._pair_one(food_text)
+        if request.path == "/batch":
+            if request.method != "POST":
+                raise HttpError(405, "Use POST")
+            payload = request.json()
+            return await self._pair_batch(payload.get("foods"), payload.get("explain", True))
+        raise HttpError(404, f"No such endpoint: {request.path}")
+
+    async def _pair_one(self, food_text):
+        """Pair a single dish in a thread, so a slow analyzer cannot stall the event loop or outlive its timeout"""
+        if not isinstance(food_text, str) or not food_text.strip():
+            raise HttpError(400, "Provide a non-empty 'food'")
+        return await asyncio.get_running_loop().run_in_executor(None, self._pair_food, food_text.strip())
+
+    def _pair_food(self, food_text):
+        """Pair one dish on a pinned knowledge base and build its response"""
+        with main.pinned_knowledge_base() as knowledge_base:
+            response = recommendation_response(main.pair_food(food_text))
+        response["version"] = knowledge_base.version
+        return response
+
+    async def _pair_batch(self, foods, explain=True):
+        """Pair a list of dishes, computing cache misses in the worker pool"""
+        if not isinstance(foods, list) or not all(isinstance(food_text, str) for food_text in foods):
+            raise HttpError(400, "Provide 'foods' as a list of strings")
+        if len(foods) > self.max_batch_size:
+            raise HttpError(413, f"Batches are limited to {self.max_batch_size} dishes")
+
+        # The batch is answered from one version: a knowledge base swapped in while its misses are being
+        # computed only applies to later requests
+        knowledge_base = main.active_knowledge_base()
+        if self._pool is not None and self._pool_knowledge_base is not knowledge_base:
+            self._start_pool()
+        # Cache lookups (sqlite included), merging and rendering scale with the batch, so they run in a
+        # thread like the misses themselves
+        loop = asyncio.get_running_loop()
+        cache = main.get_pairing_cache()
+        foods, keys, entries, misses = await loop.run_in_executor(
+            None, partial(self._lookup_pinned, knowledge_base, foods, cache))
+        computed = []
+        if misses:
+            profiler = main.get_profiler()
+            if profiler is not None and self._pool is not None:
+                # Worker processes profile into their own globals; bring the chunk's profile back
+                computed, snapshot = await loop.run_in_executor(self._pool, main.pair_chunk_profiled, misses,
+                                                                self.engine)
+                profiler.merge(snapshot)
+            elif self._pool is not None:
+                computed = await loop.run_in_executor(self._pool, main.pair_chunk, misses, self.engine)
+            else:
+                computed = await loop.run_in_executor(None, partial(self._pair_pinned, knowledge_base, misses))
+        records = await loop.run_in_executor(
+            None, partial(self._merge_pinned, knowledge_base, foods, keys, entries, computed, cache, bool(explain)))
+        return {"results": records, "version": knowledge_base.version}
+
+    def _lookup_pinned(self, knowledge_base, foods, cache):
+        """Strip a batch's dishes and split them into cache hits and misses on a given knowledge base"""
+        foods = [food_text.strip() for food_text in foods]
+        with main.pinned_knowledge_base(knowledge_base):
+            return (foods, *main.lookup_cached(foods, cache))
+
+    def _pair_pinned(self, knowledge_base, dishes):
+        """pair_chunk on a given knowledge base, for batches computed in a thread"""
+        with main.pinned_knowledge_base(knowledge_base):
+            return main.pair_chunk(dishes, self.engine)
+
+    def _merge_pinned(self, knowledge_base, foods, keys, entries, computed, cache, explain):
+        """Merge a batch's cached and computed results on a given knowledge base and build its responses"""
+        with main.pinned_knowledge_base(knowledge_base):
+            records = list(main.merge_cached(foods, keys, entries, computed, cache, explain=explain))
+        if explain:
+            records = [recommendation_response(record) for record in records]
+        return records
+
+    async def _reload(self):
+        """Reload the knowledge base file now and report the version in use afterwards"""
+        reloader = main.get_reloader()
+        if reloader is None:
+            raise HttpError(409, "Start the server with --kb to reload the knowledge base")
+        reloaded = await asyncio.get_running_loop().run_in_executor(None, partial(reloader.check, force=True))
+        if not reloaded and reloader.last_error is not None:
+            raise HttpError(422, f"Reload failed, keeping version {main.active_knowledge_base().version}: "
+                                 f"{reloader.last_error}")
+        return {"reloaded": reloaded, "version": main.active_knowledge_base().version, "reload": reloader.stats()}
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        """Serialize a JSON (or PlainText) response onto the stream"""
+        if isinstance(payload, PlainText):
+            body = payload.text.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+
+def main_serve(argv=None):
+    """Entry point for `python main.py serve`"""
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Serve wine pairings over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Worker processes for batch requests, 0 to use a thread (default: 1)")
+    parser.add_argument("--max-concurrency", type=int, default=64,
+                        help="Requests handled at once before new ones wait (default: 64)")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="Per-request timeout in seconds, time spent waiting for a slot included (default: 10)")
+    parser.add_argument("--engine", choices=["numpy", "python"],
+                        help="Batch scoring engine (default: numpy when installed)")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="Results kept in the in-memory cache, 0 to disable (default: 10000)")
+    parser.add_argument("--cache-file", metavar="PATH", help="sqlite file that keeps cached results across runs")
+    parser.add_argument("--kb", metavar="PATH",
+                        help="Knowledge base to use: a compiled snapshot (trusted files only, it is unpickled) "
+                             "or a JSON, TOML or sqlite source")
+    parser.add_argument("--analyzer", choices=sorted(main.ANALYZERS), default="regex",
+                        help="Food text analyzer; spacy adds lemmatization (default: regex)")
+    parser.add_argument("--fuzzy-weight", type=float, default=main.FUZZY_MATCH_WEIGHT,
+                        help=f"Score of keywords matched despite a typo, 0 to disable "
+                             f"(default: {main.FUZZY_MATCH_WEIGHT})")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each pipeline stage and report it under /stats and /metrics")
+    parser.add_argument("--watch", action="store_true",
+                        help="Reload the --kb file whenever it changes, without dropping requests")
+    parser.add_argument("--watch-interval", type=float, default=2.0,
+                        help="Seconds between checks of the --kb file with --watch (default: 2)")
+    parser.add_argument("--trace-reload-memory", action="store_true",
+                        help="Measure each reload's peak memory exactly rather than from peak RSS growth; traces "
+                             "every allocation in the process while the rebuild runs, slowing requests down")
+    args = parser.parse_args(argv)
+
+    if args.watch and not args.kb:
+        parser.error("--watch needs --kb")
+    if args.kb:
+        from knowledge_base import KnowledgeBaseReloader, load_knowledge_base
+        try:
+            main.use_knowledge_base(load_knowledge_base(args.kb))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        main.use_reloader(KnowledgeBaseReloader(args.kb, interval=args.watch_interval,
+                                                trace_memory=args.trace_reload_memory,
+                                                prepare=main.prepare_knowledge_base))
+    try:
+        main.use_analyzer(args.analyzer).terms("")
+    except (ImportError, OSError) as e:
+        parser.error(str(e))
+    main.use_fuzzy_weight(args.fuzzy_weight)
+    cache = main.configure_pairing_cache(max_entries=args.cache_size, path=args.cache_file)
+    if args.profile:
+        main.use_profiler(main.PipelineProfiler())
+    server = PairingServer(host=args.host, port=args.port, max_concurrency=args.max_concurrency,
+                           request_timeout=args.timeout, workers=args.workers, engine=args.engine, watch=args.watch)
+    print(f"Serving wine pairings on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        cache.close()
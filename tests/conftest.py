@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+FILLER = ["with", "and", "served", "over", "a", "the", "house", "fresh", "local", "jam", "honey", "sugar", "tofu",
+          "quinoa", "Grilling", "MUSSELS", "ice cream", "xyz", "sauce", "rice", "steaks", "  ", "\t"]
+SAMPLES = ["", "steak", "margherita pizza", "pad thai", "goat cheese salad", "aglio e olio", "tofu", "ice cream",
+           "Spaghetti Carbonara", "fettucine", "rosé sauce penne", "sweet potato", "choclate vdoka blue ceese",
+           "goat  cheese", "rack  of lamb", "prosciuto", "shitake risotto", "goat, cheese prosciuto",
+           "rack of-lamb shitake", "goat cheeese"]
+
+
+def seeded_dishes(count=2000, seed=1):
+    """Return a reproducible mix of keywords, filler words and typos, headed by hand-picked samples"""
+    rng = random.Random(seed)
+    vocabulary = [keyword for keywords in main.FOOD_KEYWORDS.values() for keyword in keywords]
+    dishes = list(SAMPLES)
+    for _ in range(count):
+        words = []
+        for _ in range(rng.randint(1, 12)):
+            word = rng.choice(vocabulary) if rng.random() < 0.5 else rng.choice(FILLER)
+            if len(word) > 4 and rng.random() < 0.1:
+                i = rng.randrange(1, len(word) - 1)
+                word = word[:i] + word[i + 1:]
+            words.append(word)
+        dishes.append(" ".join(words))
+    return dishes
+
+
+@pytest.fixture(scope="session")
+def dishes():
+    return seeded_dishes()
+
+
+@pytest.fixture
+def fuzzy_weight():
+    """Set the fuzzy match weight for one test, restoring the previous weight afterwards"""
+    previous = main.get_fuzzy_weight()
+    yield main.use_fuzzy_weight
+    main.use_fuzzy_weight(previous)
+
+
+def knowledge_base_with(**food_keywords):
+    """Return a knowledge base with the built-in tables plus extra keywords for the given categories"""
+    keywords = {category: list(listed) for category, listed in main.FOOD_KEYWORDS.items()}
+    for category, extra in food_keywords.items():
+        keywords[category] += extra
+    return main.KnowledgeBase(main.WINE_CHARACTERISTICS, keywords, main.WINE_PAIRING_RULES, main.DEFAULT_WINES)
+
+
+@pytest.fixture
+def swap_knowledge_base():
+    """Swap knowledge bases in for one test, restoring the active one afterwards"""
+    previous = main.active_knowledge_base()
+    yield main.use_knowledge_base
+    main.use_knowledge_base(previous)
@@ -0,0 +1,44 @@
+import re
+from collections import defaultdict
+
+import main
+
+
+def baseline_analyze_food_input(food_text):
+    """analyze_food_input as it was before the keyword matcher: nested scans over every keyword"""
+    food_text = food_text.lower()
+    words = re.findall(r'\b\w+\b', food_text)
+    result = defaultdict(float)
+    for category, keywords in main.FOOD_KEYWORDS.items():
+        for keyword in keywords:
+            if keyword in food_text:
+                result[category] += 1.0
+            elif keyword in words:
+                result[category] += 0.9
+    for word in words:
+        if len(word) > 3:
+            for category, keywords in main.FOOD_KEYWORDS.items():
+                for keyword in keywords:
+                    if word in keyword or keyword in word:
+                        result[category] += 0.5
+    return result
+
+
+def test_matches_baseline_without_fuzzy(dishes, fuzzy_weight):
+    fuzzy_weight(0)
+    for food_text in dishes:
+        assert list(main.analyze_food_input(food_text).items()) == \
+            list(baseline_analyze_food_input(food_text).items()), food_text
+
+
+def test_fuzzy_only_adds_to_baseline(dishes):
+    # Typo corrections may add categories or score, never take any away
+    for food_text in dishes:
+        analyzed = main.analyze_food_input(food_text)
+        for category, score in baseline_analyze_food_input(food_text).items():
+            assert analyzed[category] >= score, food_text
+
+
+def test_multi_word_keywords():
+    assert main.analyze_food_input("goat cheese")["cheese"] > 0
+    assert main.analyze_food_input("aglio e olio")["oil"] > 0
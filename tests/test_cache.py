@@ -0,0 +1,61 @@
+import pytest
+
+import main
+from conftest import knowledge_base_with
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = main.PairingCache(max_entries=100, path=str(tmp_path / "cache.db"))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize("food_text", ["goat  cheese", "goat\tcheese", "rack  of lamb", "  Steak  ", "Pad Thai"])
+def test_cached_results_match_uncached(cache, food_text):
+    expected_categories = main.analyze_food_input(food_text)
+    expected = [tuple(pairing) for pairing in main.determine_wine_pairings(expected_categories, food_text)]
+    for _ in range(2):  # a miss, then a hit
+        food_categories, wine_pairings = main.recommend(food_text, cache)
+        assert dict(food_categories) == dict(expected_categories)
+        assert [tuple(pairing) for pairing in wine_pairings] == expected
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_case_and_surrounding_whitespace_share_an_entry(cache):
+    main.recommend("Margherita Pizza", cache)
+    main.recommend("  margherita pizza ", cache)
+    assert cache.hits == 1
+
+
+def test_disk_tier_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = main.PairingCache(path=path)
+    main.recommend("steak au poivre", cache)
+    cache.close()
+    reopened = main.PairingCache(path=path)
+    try:
+        food_categories, wine_pairings = main.recommend("steak au poivre", reopened)
+        assert reopened.disk_hits == 1
+        assert [tuple(pairing) for pairing in wine_pairings] == \
+            [tuple(pairing) for pairing in main.determine_wine_pairings(food_categories, "steak au poivre")]
+    finally:
+        reopened.close()
+
+
+def test_changing_the_fuzzy_weight_drops_cached_results(cache, fuzzy_weight):
+    food_categories, _ = main.recommend("prosciuto", cache)
+    assert dict(food_categories) == {"pork": main.FUZZY_MATCH_WEIGHT}
+    fuzzy_weight(0)
+    food_categories, _ = main.recommend("prosciuto", cache)
+    assert dict(food_categories) == {}
+    assert cache.hits == 0 and cache.disk_hits == 0 and cache.version_changes == 1
+
+
+def test_results_from_a_swapped_out_knowledge_base_are_not_cached(cache, swap_knowledge_base):
+    with main.pinned_knowledge_base() as knowledge_base:
+        food_categories = main.analyze_food_input("porchetta")
+        swap_knowledge_base(knowledge_base_with(pork=["porchetta"]))
+        cache.put("porchetta", food_categories, None, knowledge_base=knowledge_base)
+    assert cache.get("porchetta") is None
+    assert main.recommend("porchetta", cache)[0] == main.analyze_food_input("porchetta") != food_categories
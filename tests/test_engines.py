@@ -0,0 +1,27 @@
+import pytest
+
+import main
+
+pytest.importorskip("numpy")
+
+
+def batch(dishes, **kwargs):
+    """Run pair_dishes with a fresh in-memory cache, so every dish is scored by the chosen engine"""
+    return list(main.pair_dishes(dishes, cache=main.PairingCache(max_entries=100), **kwargs))
+
+
+def test_pair_many_matches_determine_wine_pairings(dishes):
+    category_dicts = main.analyze_many(dishes)
+    vectorized = main.get_vectorized_scorer().pair_many(category_dicts, dishes, top_k=5)
+    for food_text, food_categories, pairings in zip(dishes, category_dicts, vectorized):
+        expected = main.determine_wine_pairings(food_categories, food_text)
+        assert [tuple(pairing) for pairing in pairings] == [tuple(pairing) for pairing in expected], food_text
+
+
+@pytest.mark.parametrize("explain", [True, False])
+def test_batch_engines_agree(dishes, explain):
+    assert batch(dishes, engine="numpy", explain=explain) == batch(dishes, engine="python", explain=explain)
+
+
+def test_batch_workers_agree(dishes):
+    assert batch(dishes[:300], engine="numpy", workers=2, chunk_size=64) == batch(dishes[:300], engine="python")
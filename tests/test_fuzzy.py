@@ -0,0 +1,61 @@
+import pytest
+
+import main
+
+TIED_SAMPLES = ["choclate vdoka blue ceese", "prosciuto", "shitake risotto", "fettucine"]
+
+
+def pairings_by_engine(food_texts):
+    """Return the (wine, score) rankings of the numpy and python engines for the same dishes"""
+    category_dicts = main.analyze_many(food_texts)
+    numpy_results = main.get_vectorized_scorer().pair_many(category_dicts, food_texts, top_k=5)
+    python_results = [main.determine_wine_pairings(food_categories, food_text)
+                      for food_categories, food_text in zip(category_dicts, food_texts)]
+    return ([[(pairing.wine, pairing.score) for pairing in pairings] for pairings in numpy_results],
+            [[(pairing.wine, pairing.score) for pairing in pairings] for pairings in python_results])
+
+
+@pytest.mark.parametrize("weight", [0.1, 0.6, 0.7, 0.8, 0.9])
+def test_engines_agree_under_any_weight(dishes, fuzzy_weight, weight):
+    pytest.importorskip("numpy")
+    fuzzy_weight(weight)
+    numpy_results, python_results = pairings_by_engine(TIED_SAMPLES + dishes[:500])
+    assert numpy_results == python_results
+
+
+def test_scores_are_quantized(fuzzy_weight):
+    fuzzy_weight(0.7)
+    for pairing in main.determine_wine_pairings(main.analyze_food_input("choclate vdoka"), "choclate vdoka"):
+        assert pairing.score == round(pairing.score, main.SCORE_DECIMALS)
+
+
+@pytest.mark.parametrize("word", ["mustard", "fired", "coffee", "sherry", "paste", "coast"])
+def test_real_words_are_not_corrected(word):
+    # Each is one edit from a keyword word: custard, fried, toffee, cherry, pasta, roast
+    assert main.get_fuzzy_match_index().correct(word) is None
+
+
+def test_typos_are_corrected():
+    fuzzy_index = main.get_fuzzy_match_index()
+    assert [fuzzy_index.correct(word) for word in ("choclate", "prosciuto", "shitake", "fettucine")] == \
+        ["chocolate", "prosciutto", "shiitake", "fettuccine"]
+    assert "dessert" not in main.analyze_food_input("mustard glazed pork")
+
+
+
+@pytest.mark.parametrize("food_text, typo_category", [("goat, cheese prosciuto", "pork"),
+                                                      ("rack of-lamb shitake", "mushroom")])
+def test_corrections_only_credit_keywords_they_are_part_of(fuzzy_weight, food_text, typo_category):
+    # Rejoining the words would turn "goat, cheese" into "goat cheese" and "of-lamb" into "rack of lamb";
+    # only the misspelled word may add to the scores
+    fuzzy_weight(0)
+    exact = main.analyze_food_input(food_text)
+    fuzzy_weight(0.8)
+    corrected = main.analyze_food_input(food_text)
+    assert dict(corrected) == dict(exact, **{typo_category: exact.get(typo_category, 0) + 0.8})
+
+
+def test_corrections_complete_multi_word_keywords(fuzzy_weight):
+    fuzzy_weight(0.8)
+    # "goat cheese" and "cheese" are both found once "cheeese" is corrected
+    assert main.analyze_food_input("goat cheeese")["cheese"] == pytest.approx(0.5 + 2 * 0.8)
@@ -0,0 +1,34 @@
+import pytest
+
+from inventory import Inventory
+
+ROWS = [
+    ("CS-1", "Ridge Cabernet", "Cabernet Sauvignon", 45.0, 3, "California", 4.5),
+    ("CS-2", "Budget Cabernet", "Cabernet Sauvignon", 12.0, 10, "Chile", 3.8),
+    ("CS-3", "Sold Out Cabernet", "Cabernet Sauvignon", 20.0, 0, "Chile", 4.9),
+    ("PN-1", "Willamette Pinot", "Pinot Noir", 30.0, 5, "Oregon", 4.2),
+]
+
+
+@pytest.fixture
+def inventory():
+    return Inventory(ROWS)
+
+
+def test_ranked_by_wine_then_rating(inventory):
+    bottles = inventory.top_bottles([("Pinot Noir", 2.0), ("Cabernet Sauvignon", 3.0)])
+    assert [bottle.sku for bottle in bottles] == ["CS-1", "CS-2", "PN-1"]
+
+
+def test_price_range(inventory):
+    bottles = inventory.top_bottles([("Cabernet Sauvignon", 3.0), ("Pinot Noir", 2.0)], min_price=15, max_price=40)
+    assert [bottle.sku for bottle in bottles] == ["PN-1"]
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_no_bottles_for_k_below_one(inventory, k):
+    assert inventory.top_bottles([("Cabernet Sauvignon", 3.0)], k=k) == []
+
+
+def test_k_limits_bottles(inventory):
+    assert len(inventory.top_bottles([("Cabernet Sauvignon", 3.0), ("Pinot Noir", 2.0)], k=2)) == 2
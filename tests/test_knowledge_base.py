@@ -0,0 +1,101 @@
+import json
+import sqlite3
+
+import pytest
+
+import main
+from knowledge_base import builtin_tables, load_knowledge_base, load_source, validate_tables, write_snapshot
+
+
+def pairings_on(knowledge_base, dishes):
+    """Pair dishes on knowledge_base with the rule engine, as comparable values"""
+    with main.pinned_knowledge_base(knowledge_base):
+        return [(dict(food_categories), [tuple(pairing) for pairing in wine_pairings])
+                for food_categories, wine_pairings in main.pair_chunk(dishes, engine="python")]
+
+
+def extended_tables():
+    """The built-in tables with one extra keyword, so a source that silently falls back would be caught"""
+    tables = builtin_tables()
+    tables["food_keywords"] = dict(tables["food_keywords"], pork=tables["food_keywords"]["pork"] + ["porchetta"])
+    return tables
+
+
+def test_snapshot_round_trip(tmp_path, dishes):
+    source = tmp_path / "kb.json"
+    source.write_text(json.dumps(extended_tables()), encoding="utf-8")
+    snapshot = str(tmp_path / "kb.snap")
+    write_snapshot(load_knowledge_base(str(source)), snapshot)
+
+    loaded = load_knowledge_base(snapshot)
+    expected = load_knowledge_base(str(source))
+    assert loaded.fingerprint == expected.fingerprint
+    sample = dishes[:500] + ["porchetta"]
+    assert pairings_on(loaded, sample) == pairings_on(expected, sample)
+    assert pairings_on(loaded, ["porchetta"])[0][0]["pork"] >= 1
+
+
+def test_truncated_snapshot_is_rejected(tmp_path):
+    snapshot = tmp_path / "kb.snap"
+    write_snapshot(main.KnowledgeBase(**builtin_tables()), str(snapshot))
+    snapshot.write_bytes(snapshot.read_bytes()[:-10])
+    with pytest.raises(ValueError, match="truncated"):
+        load_knowledge_base(str(snapshot))
+
+
+def test_validate_tables_reports_errors():
+    tables = builtin_tables()
+    retsina = {"flavors": ["pine"], "characteristics": []}
+    tables["wine_characteristics"] = dict(tables["wine_characteristics"], Retsina=retsina)
+    tables["food_keywords"] = dict(tables["food_keywords"], pork=["Porchetta"])
+    tables["default_wines"] = {}
+    with pytest.raises(ValueError) as error:
+        validate_tables(tables)
+    message = str(error.value)
+    assert "'Retsina' is missing 'body'" in message
+    assert "'Porchetta' in 'pork' must be lowercase" in message
+    assert "'versatile'" in message
+
+
+def test_validate_tables_warns_about_dangling_references():
+    tables = builtin_tables()
+    tables["wine_pairing_rules"] = dict(tables["wine_pairing_rules"], **{"tofu": ["Retsina"]})
+    warnings = validate_tables(tables)
+    assert any("'tofu'" in warning and "never matches" in warning for warning in warnings)
+    assert any("'Retsina'" in warning and "no characteristics entry" in warning for warning in warnings)
+    with pytest.raises(ValueError):
+        validate_tables(tables, strict=True)
+
+
+def test_sqlite_source(tmp_path):
+    path = str(tmp_path / "kb.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE food_keywords (category TEXT, keyword TEXT)")
+    connection.executemany("INSERT INTO food_keywords VALUES (?, ?)",
+                           [(category, keyword) for category, keywords in extended_tables()["food_keywords"].items()
+                            for keyword in keywords])
+    connection.execute("CREATE TABLE wines (name TEXT, body TEXT, tannins TEXT, acidity TEXT, flavors TEXT, "
+                       "pairings TEXT, characteristics TEXT)")
+    for name, char in builtin_tables()["wine_characteristics"].items():
+        connection.execute("INSERT INTO wines VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (name, char["body"], char.get("tannins"), char.get("acidity"), json.dumps(char["flavors"]),
+                            json.dumps(char.get("pairings", [])), json.dumps(char["characteristics"])))
+    connection.commit()
+    connection.close()
+
+    knowledge_base = load_source(path)
+    assert knowledge_base.food_keywords == extended_tables()["food_keywords"]
+    assert list(knowledge_base.wine_characteristics) == list(main.WINE_CHARACTERISTICS)
+    # Tables the database leaves out fall back to the built-in ones
+    assert knowledge_base.wine_pairing_rules == main.WINE_PAIRING_RULES
+
+
+def test_toml_source(tmp_path):
+    path = tmp_path / "kb.toml"
+    path.write_text('[food_keywords]\npork = ["pork", "porchetta"]\n\n[default_wines]\n'
+                    'versatile = ["Pinot Noir"]\n', encoding="utf-8")
+    knowledge_base = load_source(str(path))
+    assert knowledge_base.food_keywords == {"pork": ["pork", "porchetta"]}
+    assert knowledge_base.default_wines == {"versatile": ["Pinot Noir"]}
+    assert knowledge_base.wine_characteristics == main.WINE_CHARACTERISTICS
+    assert set(pairings_on(knowledge_base, ["porchetta"])[0][0]) == {"pork"}
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from menu import WINE_COLORS, MenuProblem, optimize_menu, solve_exact, solve_greedy
+
+WINES = list(WINE_COLORS)
+
+
+def random_problems(count=40, seed=3):
+    """Yield small random menu problems over the built-in wines, with and without color minimums"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        scores = []
+        for _ in range(rng.randint(1, 25)):
+            wines = rng.sample(range(len(WINES)), rng.randint(0, 6))
+            scores.append({wine: rng.choice([0.5, 1.0, 1.5, 2.0, 3.0]) for wine in wines})
+        budget = rng.randint(1, 4)
+        min_red = rng.randint(0, budget)
+        min_white = rng.randint(0, budget - min_red)
+        yield MenuProblem(WINES, scores, budget, min_red, min_white)
+
+
+def colors(problem, selection):
+    """Colors of the selected wines"""
+    return [problem.colors[wine] for wine in selection]
+
+
+def test_greedy_meets_the_color_minimums():
+    for problem in random_problems():
+        selection, value = solve_greedy(problem)
+        assert len(set(selection)) == len(selection) <= problem.budget
+        assert colors(problem, selection).count("red") >= problem.min_red
+        assert colors(problem, selection).count("white") >= problem.min_white
+        assert value == pytest.approx(problem.value(selection))
+
+
+def test_upper_bound_is_at_least_the_optimum():
+    np = pytest.importorskip("numpy")
+    for problem in random_problems():
+        selection, value = solve_greedy(problem)
+        optimum_selection, optimum = solve_exact(problem, np)
+        assert problem.satisfies_colors(optimum_selection)
+        assert value <= optimum + 1e-9
+        assert problem.upper_bound(selection) >= optimum - 1e-9
+        assert problem.upper_bound([]) >= optimum - 1e-9
+
+
+def test_optimize_menu_honors_the_minimums(dishes):
+    plan = optimize_menu(dishes[:60], budget=3, min_red=1, min_white=1)
+    picked = [wine["color"] for wine in plan["wines"]]
+    assert picked.count("red") >= 1 and picked.count("white") >= 1
+    assert plan["total_score"] <= plan["upper_bound"]
+    assert sum(assignment["score"] for assignment in plan["courses"]) == pytest.approx(plan["total_score"])
+    assert {assignment["wine"] for assignment in plan["courses"]} - {None} <= {wine["wine"] for wine in plan["wines"]}
@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+import pytest
+
+import main
+
+
+def baseline_determine_wine_pairings(food_categories, food_text):
+    """determine_wine_pairings as it was before structured results: every explanation built eagerly"""
+    scores = defaultdict(float)
+    explanations = defaultdict(list)
+    for rule, wines in main.WINE_PAIRING_RULES.items():
+        if "+" in rule:
+            rule_categories = [part.strip() for part in rule.split("+")]
+            if all(cat in food_categories for cat in rule_categories):
+                for wine in wines:
+                    scores[wine] += sum(food_categories[cat] for cat in rule_categories)
+                    explanations[wine].append(f"Perfect for {rule} combinations")
+    for category, score in sorted(food_categories.items(), key=lambda x: x[1], reverse=True):
+        for wine in main.WINE_PAIRING_RULES.get(category, ()):
+            scores[wine] += score
+            explanations[wine].append(f"Pairs well with {category}")
+    if not scores:
+        sweet_terms = ["sweet", "dessert", "cake", "pie", "jam", "jelly", "candy", "sugar", "honey",
+                       "chocolate", "ice cream", "pudding", "fruit", "berry", "syrup", "caramel"]
+        if any(term in food_text.lower() for term in sweet_terms):
+            for wine in ["Dessert Wine", "Riesling", "Gewürztraminer"]:
+                scores[wine] += 1.0
+                explanations[wine].append(f"A good match for sweet foods like {food_text}")
+        else:
+            for wine in main.DEFAULT_WINES["versatile"]:
+                scores[wine] += 1.0
+                explanations[wine].append(f"A versatile wine that pairs with many foods including {food_text}")
+            if "Pinot Noir" not in main.DEFAULT_WINES["versatile"]:
+                scores["Pinot Noir"] += 0.8
+                explanations["Pinot Noir"].append("A versatile red that pairs with many foods")
+            if "Chardonnay" not in main.DEFAULT_WINES["versatile"]:
+                scores["Chardonnay"] += 0.8
+                explanations["Chardonnay"].append("A versatile white that pairs with many foods")
+    for wine in scores:
+        if wine in main.WINE_CHARACTERISTICS:
+            char = main.WINE_CHARACTERISTICS[wine]
+            explanations[wine].append(f"A {char['body']}-bodied {', '.join(char['characteristics'])} wine "
+                                      f"with {', '.join(char['flavors'][:2])} notes")
+    return [(wine, score, " ".join(sorted(explanations[wine], key=len)[:2]))
+            for wine, score in sorted(scores.items(), key=lambda x: x[1], reverse=True) if score > 0]
+
+
+def test_matches_baseline(dishes, fuzzy_weight):
+    # Without typo corrections every score is a multiple of 0.5, so ties are exact in both versions
+    fuzzy_weight(0)
+    for food_text in dishes:
+        food_categories = main.analyze_food_input(food_text)
+        expected = baseline_determine_wine_pairings(food_categories, food_text)
+        assert [tuple(pairing) for pairing in main.determine_wine_pairings(food_categories, food_text)] == \
+            expected[:5], food_text
+        assert [tuple(pairing) for pairing in main.determine_wine_pairings(food_categories, food_text, None)] == \
+            expected, food_text
+
+
+def test_top_k_is_a_prefix_of_the_full_ranking(dishes):
+    for food_text in dishes[:500]:
+        food_categories = main.analyze_food_input(food_text)
+        ranking = [pairing.wine for pairing in main.determine_wine_pairings(food_categories, food_text, None)]
+        for top_k in (1, 3, 5):
+            top = main.determine_wine_pairings(food_categories, food_text, top_k)
+            assert [pairing.wine for pairing in top] == ranking[:top_k], food_text
+
+
+def test_explanations_are_rendered_lazily():
+    pairing = main.determine_wine_pairings(main.analyze_food_input("steak"), "steak")[0]
+    assert pairing._explanation is None
+    wine, score, explanation = pairing
+    assert explanation and pairing._explanation == explanation
+
+
+def test_batch_without_explanations(dishes):
+    dishes = dishes[:500]
+    explained = list(main.pair_dishes(dishes, cache=main.PairingCache(max_entries=100)))
+    bare = list(main.pair_dishes(dishes, cache=main.PairingCache(max_entries=100), explain=False))
+    for record, bare_record in zip(explained, bare, strict=True):
+        assert bare_record["food"] == record["food"]
+        assert bare_record["categories"] == record["categories"]
+        assert bare_record["pairings"] == [{"wine": pairing["wine"], "score": pairing["score"]}
+                                           for pairing in record["pairings"]]
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_batch_rejects_empty_chunks(chunk_size):
+    with pytest.raises(ValueError):
+        list(main.pair_dishes(["steak"], chunk_size=chunk_size))
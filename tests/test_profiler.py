@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def profiler():
+    profiler = main.use_profiler(main.PipelineProfiler())
+    yield profiler
+    main.use_profiler(None)
+
+
+def test_no_stage_is_counted_twice(profiler):
+    pytest.importorskip("numpy")
+    # No rule matches these, so the numpy engine hands every one to determine_wine_pairings, whose own
+    # stages time them
+    fallbacks = [f"house special {number}" for number in range(1000)]
+    main.pair_chunk(fallbacks[:10], "numpy")
+    recorded, start = profiler.seconds(profiler.STAGES), time.perf_counter()
+    main.pair_chunk(fallbacks, "numpy")
+    elapsed = time.perf_counter() - start
+    assert profiler.counters["fallback_hits"] == 1010
+    assert profiler.seconds(profiler.STAGES) - recorded <= elapsed
+
+
+def test_keyword_hits(profiler):
+    main.analyze_food_input("goat cheese")
+    # "goat cheese" and "cheese" are both found
+    assert profiler.counters["keyword_hits"] >= 2
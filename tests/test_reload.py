@@ -0,0 +1,72 @@
+import json
+import threading
+
+import main
+from conftest import knowledge_base_with
+from knowledge_base import KnowledgeBaseReloader, builtin_tables, load_knowledge_base
+
+
+def plain(result):
+    """Turn one (food_categories, wine_pairings) result into comparable values"""
+    food_categories, wine_pairings = result
+    return dict(food_categories), [tuple(pairing) for pairing in wine_pairings]
+
+
+def pair_porchetta():
+    """Pair a dish that only the test's extended knowledge base recognizes, on the calling thread's version"""
+    return plain(main.pair_chunk(["porchetta"], engine="python")[0])
+
+
+def test_pinned_calls_finish_on_the_version_they_started_with(swap_knowledge_base):
+    old = main.active_knowledge_base()
+    new = knowledge_base_with(pork=["porchetta"])
+    with main.pinned_knowledge_base(new):
+        expected_new = pair_porchetta()
+    expected_old = pair_porchetta()
+    assert expected_old != expected_new
+
+    pinned, swapped, results = threading.Event(), threading.Event(), {}
+
+    def pair():
+        with main.pinned_knowledge_base() as knowledge_base:
+            pinned.set()
+            swapped.wait()
+            results["knowledge_base"] = knowledge_base
+            results["chunk"] = pair_porchetta()
+            results["recommend"] = plain(main.recommend("porchetta", main.PairingCache()))
+
+    thread = threading.Thread(target=pair)
+    thread.start()
+    pinned.wait()
+    swap_knowledge_base(new)
+    swapped.set()
+    thread.join()
+
+    assert results["knowledge_base"] is old
+    assert results["chunk"] == expected_old
+    assert results["recommend"] == expected_old
+    assert main.get_knowledge_base() is new
+    assert pair_porchetta() == expected_new
+
+
+def test_failed_reload_keeps_the_old_version(tmp_path, swap_knowledge_base):
+    path = tmp_path / "kb.json"
+    path.write_text(json.dumps(builtin_tables()), encoding="utf-8")
+    swap_knowledge_base(load_knowledge_base(str(path)))
+    current = main.active_knowledge_base()
+    reloader = KnowledgeBaseReloader(str(path))
+
+    path.write_text('{"food_keywords": ', encoding="utf-8")
+    assert not reloader.check(force=True)
+    assert main.active_knowledge_base() is current
+    assert reloader.failures == 1 and reloader.reloads == 0
+    assert reloader.last_error.startswith("ValueError")
+
+    tables = builtin_tables()
+    tables["food_keywords"] = dict(tables["food_keywords"], pork=tables["food_keywords"]["pork"] + ["porchetta"])
+    path.write_text(json.dumps(tables), encoding="utf-8")
+    assert reloader.check(force=True)
+    assert main.active_knowledge_base() is not current
+    assert reloader.reloads == 1 and reloader.last_error is None
+    assert reloader.last_reload["previous_version"] == current.version
+    assert reloader.last_reload["peak_memory_kb"] is not None
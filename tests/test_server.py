@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import main
+from server import HttpRequest, PairingServer
+
+
+async def request(server, method, target, payload=None):
+    """Send one request to a running server and return (status, decoded JSON body)"""
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def serve(test, **options):
+    """Run test(server) against a server listening on an ephemeral port"""
+    async def run():
+        server = PairingServer(port=0, workers=0, **options)
+        await server.start()
+        try:
+            return await test(server)
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_pair_and_batch(dishes):
+    foods = dishes[:50] + ["goat  cheese", "steak"]
+
+    async def test(server):
+        status, single = await request(server, "GET", "/pair?food=rack%20%20of%20lamb")
+        assert status == 200 and single["version"] == main.active_knowledge_base().version
+        _, wine_pairings = main.recommend("rack  of lamb")
+        assert [entry["wine"] for entry in single["recommendations"]] == [pairing.wine for pairing in wine_pairings]
+
+        status, batch = await request(server, "POST", "/batch", {"foods": foods, "explain": False})
+        assert status == 200
+        assert batch["results"] == list(main.pair_dishes(foods, cache=main.PairingCache(), explain=False))
+        status, _ = await request(server, "POST", "/batch", {"foods": "steak"})
+        assert status == 400
+    serve(test)
+
+
+def test_waiting_for_a_slot_counts_against_the_timeout():
+    async def test(server):
+        loop = asyncio.get_running_loop()
+        await server._slots.acquire()
+        loop.call_later(0.15, server._slots.release)
+        start = loop.time()
+        status, _ = await server._dispatch(HttpRequest("POST", "/reload", {}, {}, b"", False))
+        # The slot frees after 0.15s, leaving 0.05s of the 0.2s timeout; /reload answers 409 right away
+        assert status == 409 and loop.time() - start < 0.2
+
+        await server._slots.acquire()
+        loop.call_later(0.15, server._slots.release)
+        server._route = lambda request: asyncio.sleep(0.1)
+        start = loop.time()
+        status, _ = await server._dispatch(HttpRequest("GET", "/health", {}, {}, b"", False))
+        assert status == 504 and loop.time() - start < 0.25
+    serve(test, max_concurrency=1, request_timeout=0.2)
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+import main
+from typeahead import IncrementalAnalysis, TypeaheadSession, accept_completion
+
+
+def keystrokes(food_text, rng):
+    """Yield the texts seen while typing food_text with the odd backspace, retyped word and cleared tail"""
+    text = ""
+    for char in food_text:
+        text += char
+        yield text
+        roll = rng.random()
+        if roll < 0.1 and text:
+            text = text[:-1]
+            yield text
+            text += char
+            yield text
+        elif roll < 0.13:
+            cut = rng.randrange(len(text) + 1)
+            yield text[:cut]
+            yield text
+        elif roll < 0.15:
+            yield text + "x"
+            yield text
+
+
+@pytest.mark.parametrize("weight", [0, main.FUZZY_MATCH_WEIGHT])
+def test_updates_match_full_analysis(dishes, fuzzy_weight, weight):
+    fuzzy_weight(weight)
+    rng = random.Random(7)
+    analysis = IncrementalAnalysis()
+    for food_text in dishes[:300]:
+        for text in keystrokes(food_text, rng):
+            assert dict(analysis.update(text)) == dict(main.analyze_food_input(text)), text
+
+
+def test_unrelated_texts_in_a_row(dishes):
+    analysis = IncrementalAnalysis()
+    for food_text in dishes[:300]:
+        assert dict(analysis.update(food_text)) == dict(main.analyze_food_input(food_text)), food_text
+
+
+def test_completion():
+    session = TypeaheadSession()
+    view = session.update("rack of l")
+    assert view["completions"][0] == "rack of lamb"
+    assert accept_completion("rack of l", view) == "rack of lamb "
@@ -0,0 +1,31 @@
+import pytest
+
+import main
+from wine_lookup import wine_report
+
+
+def test_resolve_accepts_either_half_of_a_name():
+    index = main.get_wine_food_index()
+    assert index.resolve("shiraz") == "Syrah/Shiraz"
+    assert index.resolve("  SYRAH ") == "Syrah/Shiraz"
+    assert index.resolve("pinot noir") == "Pinot Noir"
+    with pytest.raises(ValueError):
+        index.resolve("retsina")
+
+
+def test_engines_rank_dishes_alike(dishes, monkeypatch):
+    pytest.importorskip("numpy")
+    dishes = dishes[:400]
+    category_dicts = main.analyze_many([main.normalize_food_text(food_text) for food_text in dishes])
+    wines = main.get_wine_food_index().wines
+    monkeypatch.setattr(main, "default_engine", lambda: "numpy")
+    vectorized = [main.dishes_for_wine(wine, dishes, category_dicts=category_dicts) for wine in wines]
+    monkeypatch.setattr(main, "default_engine", lambda: "python")
+    assert [main.dishes_for_wine(wine, dishes, category_dicts=category_dicts) for wine in wines] == vectorized
+    assert any(vectorized)
+
+
+def test_report_ranks_the_given_dishes():
+    report = wine_report("shiraz", ["steak", "ice cream", "grilled lamb chops", "lemon sorbet"], limit=2)
+    assert report["wine"] == "Syrah/Shiraz"
+    assert [dish["food"] for dish in report["dishes"]] == ["grilled lamb chops", "steak"]
@@ -0,0 +1,300 @@
+"""
+As-you-type pairing: detected categories, top wines and keyword completions updated on every keystroke
+
+Typing almost always edits the end of the text, so the analysis keeps its state between keystrokes instead
+of running analyze_food_input on the whole string again:
+
+- the keyword automaton's state is saved after every character, and an edit resumes the scan from the
+  first changed character;
+- words before the edit keep their partial-match hits, and only the words from the edit on are looked up;
+- the text with typos corrected in place is rescanned the same way, so a correction in the last word
+  costs a few automaton steps.
+
+The result is the same as analyze_food_input on the full text. Completions come from a prefix trie over
+the keyword vocabulary (main.KeywordTrie). Start it with `python main.py --live`.
+"""
+import codecs
+import os
+import re
+import shutil
+import sys
+import time
+from collections import defaultdict
+
+import main
+
+# Keystroke latency the incremental path is held to; the typeahead benchmark suite checks it
+KEYSTROKE_BUDGET_MS = 3.0
+# Words as RegexAnalyzer sees them; \w+ runs are exactly its \b\w+\b tokens
+WORD = re.compile(r'\w+')
+# Cursor keys and other terminal escape sequences, which live mode ignores
+ESCAPE_SEQUENCE = re.compile(r'\x1b(\[[0-9;?]*[ -/]*[@-~]|O.|.)?')
+
+
+def common_prefix_length(a, b):
+    """Return the length of the longest common prefix of two strings"""
+    if b.startswith(a):
+        return len(a)
+    length = 0
+    for char_a, char_b in zip(a, b):
+        if char_a != char_b:
+            break
+        length += 1
+    return length
+
+
+class ResumableScan:
+    """Keywords found in a text that is edited at its end, rescanning only from the first changed character"""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.text = ""
+        # Automaton state before each character (one more than the text length) and keywords ending at each
+        self._states = [0]
+        self._outputs = []
+        # Keyword id -> number of places it ends; the keys are the keywords found
+        self._counts = {}
+
+    @property
+    def found(self):
+        """The keyword ids found in the text, as a set-like view"""
+        return self._counts.keys()
+
+    @property
+    def outputs(self):
+        """The keyword ids ending at each character of the text"""
+        return self._outputs
+
+    def update(self, text):
+        """Move to a new text, undoing the scan past the common prefix and scanning the rest"""
+        keep = common_prefix_length(self.text, text)
+        counts = self._counts
+        for output in self._outputs[keep:]:
+            for keyword_id in output:
+                if counts[keyword_id] == 1:
+                    del counts[keyword_id]
+                else:
+                    counts[keyword_id] -= 1
+        del self._states[keep + 1:]
+        del self._outputs[keep:]
+
+        for state, output in self.matcher.scan(text[keep:], self._states[-1]):
+            self._states.append(state)
+            self._outputs.append(output)
+            for keyword_id in output:
+                counts[keyword_id] = counts.get(keyword_id, 0) + 1
+        self.text = text
+
+
+class IncrementalAnalysis:
+    """
+    analyze_food_input for a text that changes a keystroke at a time, reusing the previous keystroke's work
+    Only the default regex analyzer is incremental; with another analyzer every update analyzes the text
+    from scratch. A knowledge base swapped in between updates starts the analysis over.
+    """
+
+    def __init__(self):
+        self.knowledge_base = None
+        self.reset()
+
+    def reset(self):
+        """Forget all state, e.g. when the text is cleared or the knowledge base changes"""
+        self.knowledge_base = main.get_knowledge_base()
+        self.matcher = self.knowledge_base.keyword_matcher
+        self.partial_index = self.knowledge_base.partial_match_index
+        self.text = ""
+        self._exact = ResumableScan(self.matcher)
+        self._corrected = ResumableScan(self.matcher)
+        # (end offset, word, partial-match hits or None for words too short to look up) per word
+        self._words = []
+
+    def update(self, food_text):
+        """Return the categories analyze_food_input would detect in food_text"""
+        if main.get_knowledge_base() is not self.knowledge_base:
+            self.reset()
+        if main.get_analyzer().name != "regex":
+            return main.analyze_food_input(food_text)
+
+        text = food_text.lower()
+        changed = common_prefix_length(self.text, text)
+        self._exact.update(text)
+
+        # Words ending before the first changed character cannot change; a word ending right at it could
+        # still grow, so it is looked up again
+        words = self._words
+        while words and words[-1][0] >= changed:
+            words.pop()
+        partial_index = self.partial_index
+        for match in WORD.finditer(text, words[-1][0] if words else 0):
+            word = match.group()
+            words.append((match.end(), word, partial_index.category_hits(word) if len(word) > 3 else None))
+        self.text = text
+        return self._score()
+
+    def _score(self):
+        """Combine the saved exact, partial and fuzzy matches the way score_food_terms does"""
+        result = defaultdict(float)
+        matcher = self.matcher
+        found = self._exact.found
+        for category, hits in matcher.category_counts(found):
+            result[category] += 1.0 * hits
+
+        unmatched = []
+        for _, word, partial_hits in self._words:
+            if partial_hits is None:
+                continue
+            for category, hits in partial_hits:
+                result[category] += 0.5 * hits
+            if not partial_hits:
+                unmatched.append(word)
+
+        fuzzy_weight = main.get_fuzzy_weight()
+        if fuzzy_weight and unmatched:
+            fuzzy_index = self.knowledge_base.fuzzy_match_index
+            corrections = {}
+            for word in unmatched:
+                correction = fuzzy_index.correct(word)
+                if correction is not None:
+                    corrections[word] = correction
+            if corrections:
+                corrected_text, spans = main.correct_words(self.text, corrections)
+                self._corrected.update(corrected_text)
+                corrected = matcher.overlapping(self._corrected.outputs, spans)
+                for category, hits in matcher.category_counts(corrected - found):
+                    result[category] += fuzzy_weight * hits
+        return result
+
+
+class TypeaheadSession:
+    """
+    State of one as-you-type session: returns the live view of the text after each keystroke
+    top_k wines and up to `completions` keyword completions are shown
+    """
+
+    def __init__(self, top_k=3, completions=5):
+        self.top_k = top_k
+        self.completions = completions
+        self.analysis = IncrementalAnalysis()
+
+    def complete(self, text):
+        """
+        Return (the trailing text being completed, keywords it could become)
+        The longest trailing run of words that starts a keyword wins, so "rack of l" completes to "rack of lamb"
+        """
+        trie = main.get_keyword_trie()
+        starts = [match.start() for match in WORD.finditer(text)][-trie.max_words:]
+        for start in starts:
+            fragment = text[start:]
+            keywords = [keyword for keyword in trie.complete(fragment) if keyword != fragment]
+            if keywords:
+                return fragment, keywords[:self.completions]
+        return "", []
+
+    def update(self, food_text):
+        """Return the view of food_text as a dict: categories, top wines, completions and the update time"""
+        start = time.perf_counter()
+        food_categories = self.analysis.update(food_text)
+        text = food_text.lower()
+        fragment, completions = self.complete(text) if text[-1:].strip() else ("", [])
+        wine_pairings = main.determine_wine_pairings(food_categories, food_text, self.top_k) if text.strip() else []
+        return {
+            "food": food_text,
+            "categories": sorted(((category, score) for category, score in food_categories.items() if score > 0),
+                                 key=lambda item: -item[1]),
+            "pairings": wine_pairings,
+            "fragment": fragment,
+            "completions": completions,
+            "ms": (time.perf_counter() - start) * 1000,
+        }
+
+
+def accept_completion(food_text, view):
+    """Return food_text with its trailing fragment replaced by the first completion"""
+    if not view["completions"]:
+        return food_text
+    return food_text[:len(food_text) - len(view["fragment"])] + view["completions"][0] + " "
+
+
+def render_view(view, prompt, width):
+    """Return the lines live mode shows under the cursor, clipped to the terminal width"""
+    shown_text = view["food"][-(width - len(prompt) - 1):] if width > len(prompt) + 1 else ""
+    lines = [prompt + shown_text]
+    if view["completions"]:
+        lines.append("  Tab: " + ", ".join(view["completions"]))
+    else:
+        lines.append("")
+    lines.append("  Detected: " + ", ".join(f"{category} ({score:.1f})" for category, score in view["categories"][:5]))
+    lines.append("  Wines: " + "   ".join(f"{number}. {pairing.wine} ({pairing.score:.1f})"
+                                          for number, pairing in enumerate(view["pairings"], 1)))
+    return [line[:width - 1] for line in lines], len(prompt) + len(shown_text)
+
+
+def live_mode(find_bottles=None, prompt="> "):
+    """Run the interactive CLI with the view redrawn on every keystroke; Enter shows the full recommendation"""
+    try:
+        import termios
+        import tty
+    except ImportError:
+        raise OSError("Live mode needs a POSIX terminal")
+    if not sys.stdin.isatty() or not sys.stdout.isatty():
+        raise OSError("Live mode needs an interactive terminal")
+
+    print("=== Wine and Food Pairing Assistant ===")
+    print("Start typing a dish. Tab accepts a completion, Enter shows the full recommendation,")
+    print("Ctrl+D or Ctrl+C exits.\n")
+
+    session = TypeaheadSession()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    fd = sys.stdin.fileno()
+    saved = termios.tcgetattr(fd)
+    food_text = ""
+    view = session.update(food_text)
+
+    def draw():
+        lines, column = render_view(view, prompt, shutil.get_terminal_size().columns)
+        # The cursor sits on the prompt line: clear from there down, redraw and put it back after the text
+        sys.stdout.write("\r\x1b[J" + "\n".join(lines) + f"\x1b[{len(lines) - 1}A\x1b[{column + 1}G")
+        sys.stdout.flush()
+
+    tty.setcbreak(fd)
+    try:
+        draw()
+        while True:
+            # A paste arrives as one read and is handled as one update
+            keys = ESCAPE_SEQUENCE.sub("", decoder.decode(os.read(fd, 1024)))
+            if not keys or "\x04" in keys:
+                break
+            submitted = False
+            for key in keys:
+                if key in ("\r", "\n"):
+                    submitted = True
+                    break
+                if key in ("\x7f", "\x08"):
+                    food_text = food_text[:-1]
+                elif key == "\t":
+                    food_text = accept_completion(food_text, view)
+                elif key == "\x15":  # Ctrl+U clears the line
+                    food_text = ""
+                elif key.isprintable():
+                    food_text += key
+            view = session.update(food_text)
+
+            if submitted and food_text.strip():
+                sys.stdout.write("\r\x1b[J")
+                termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+                print(f"{prompt}{food_text}")
+                _, wine_pairings = main.recommend(food_text.strip())
+                main.print_wine_recommendations(food_text.strip(), wine_pairings)
+                if find_bottles is not None:
+                    main.show_bottles(find_bottles, wine_pairings)
+                print("-" * 70)
+                tty.setcbreak(fd)
+                food_text = ""
+                view = session.update(food_text)
+            draw()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+        sys.stdout.write("\r\x1b[J")
+        print("Exiting...")
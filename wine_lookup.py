@@ -0,0 +1,90 @@
+"""
+Reverse lookup: which foods a wine pairs with
+
+The pairing rules map food categories to wines; the knowledge base inverts them once into a wine-to-foods
+index (see main.WineFoodIndex), so a lookup is a dictionary read. Given a list of dishes, they are scored
+for every wine in one vectorized pass and ranked by the chosen wine's score, along with where that wine
+places among all wines for each dish.
+
+Run it with `python main.py wine NAME [--dishes FILE]`.
+"""
+import argparse
+import json
+import sys
+
+import main
+
+
+def wine_report(wine, dishes=None, limit=None):
+    """Return the foods a wine pairs with, and optionally the given dishes ranked for it, as a JSON-ready dict"""
+    report = main.get_wine_food_index().foods_for(wine, limit)
+    if dishes is not None:
+        report["dishes"] = main.dishes_for_wine(report["wine"], dishes, limit)
+    return report
+
+
+def print_wine_report(report):
+    """Print a wine report for the terminal"""
+    print(f"=== {report['wine']} ===\n")
+    print("Pairs with:")
+    for entry in report["categories"]:
+        examples = ", ".join(entry["examples"])
+        print(f"- {entry['category'].title()}" + (f" (e.g. {examples})" if examples else ""))
+    print("")
+    if report["combinations"]:
+        print("Especially in combinations:")
+        for combination in report["combinations"]:
+            print(f"- {' + '.join(category.title() for category in combination['categories'])}")
+        print("")
+    if "dishes" in report:
+        print("Best dishes:")
+        if not report["dishes"]:
+            print("   None of the dishes call for this wine")
+        for number, dish in enumerate(report["dishes"], 1):
+            pick = "top pick" if dish["rank"] == 1 else f"#{dish['rank']} pick"
+            print(f"{number}. {dish['food']} (score {dish['score']:.2f}, {pick})")
+        print("")
+
+
+def main_wine(argv=None):
+    """Entry point for `python main.py wine`"""
+    parser = argparse.ArgumentParser(prog="main.py wine", description="Show which foods a wine pairs with")
+    parser.add_argument("wine", help="Wine to look up, e.g. 'Pinot Noir' or 'Shiraz'")
+    parser.add_argument("--dishes", metavar="FILE",
+                        help="File with one dish per line, '-' for stdin, to rank for this wine")
+    parser.add_argument("--top", type=int, help="Show at most this many categories and dishes")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--kb", metavar="PATH",
+                        help="Knowledge base to use: a compiled snapshot (trusted files only, it is unpickled) "
+                             "or a JSON, TOML or sqlite source")
+    args = parser.parse_args(argv)
+
+    if args.kb:
+        from knowledge_base import load_knowledge_base
+        try:
+            main.use_knowledge_base(load_knowledge_base(args.kb))
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+    dishes = None
+    if args.dishes:
+        try:
+            stream = sys.stdin if args.dishes == "-" else open(args.dishes, encoding="utf-8")
+        except OSError as e:
+            parser.error(str(e))
+        try:
+            dishes = list(main.read_dishes(stream))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    try:
+        report = wine_report(args.wine, dishes, args.top)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_wine_report(report)
+    return 0